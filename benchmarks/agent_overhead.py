@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.documents import Document
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "app"))
+from RAG import agent, answer_cache
+from RAG.metrics import metrics
+from RAG.clients import registry
+
+# Measures orchestration overhead of the /agent pipeline with the LLM and
+# both retrievers stubbed out, so only LangGraph, state handling and the
+# node code are timed.
+
+FINAL_JSON = '{"chosen_answer": "stub answer", "deeper_wider_than_chosen_answer": "None"}'
+
+class StubLLM:
+    async def ainvoke(self, prompt, **kwargs):
+        text = prompt if isinstance(prompt, str) else prompt[0].content
+        content = "rag" if "Tool-Select-Agent" in text else FINAL_JSON
+        return AIMessage(content=content, usage_metadata={"input_tokens": len(text) // 4, "output_tokens": len(content) // 4,
+                                                          "total_tokens": (len(text) + len(content)) // 4})
+
+    async def astream(self, prompt, **kwargs):
+        message = await self.ainvoke(prompt)
+        for i in range(0, len(message.content), 16):
+            yield AIMessageChunk(content=message.content[i:i + 16])
+        yield AIMessageChunk(content="", usage_metadata=message.usage_metadata)
+
+async def stub_kg_graph(query):
+    return [{"subject": "daň", "predicate": "upravuje", "object": "poplatník", "source_chunk": "stub"}]
+
+async def stub_vector_search(query):
+    return [Document(page_content=f"chunk {i}", metadata={"chunk_id": f"stub{i}"}) for i in range(5)]
+
+def install_stubs():
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    answer_cache.ANSWER_CACHE_ENABLED = False
+    registry.llm = StubLLM()
+    registry.started = True
+    agent.akg_graph = stub_kg_graph
+    agent.avector_search = stub_vector_search
+
+async def run_sequential(requests, per_request):
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        await per_request(i)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def report(name, latencies, wall=None):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    line = (f"  {name:<22} mean {statistics.mean(latencies) * 1e3:7.3f} ms"
+            f"  p50 {statistics.median(latencies) * 1e3:7.3f} ms  p99 {p99 * 1e3:7.3f} ms")
+    if wall is not None:
+        line += f"  {len(latencies) / wall:8.0f} req/s"
+    print(line)
+
+async def main_async(args):
+    install_stubs()
+    question = "How is the taxpayer's tax calculated?"
+
+    async def compiled_once(i):
+        return await agent.acreate_agent(question, thread_id=str(i))
+
+    async def compiled_per_request(i):
+        app = agent.build_agent()
+        async for _ in app.astream({"question": question}, config={"configurable": {"thread_id": str(i)}}):
+            pass
+
+    await run_sequential(args.warmup, compiled_once)
+    print(f"{args.requests} requests, stubbed LLM and retrievers")
+    report("compiled once", await run_sequential(args.requests, compiled_once))
+    report("compiled per request", await run_sequential(args.requests, compiled_per_request))
+
+    start = time.perf_counter()
+    latencies = []
+
+    async def timed(i):
+        t = time.perf_counter()
+        await compiled_once(i)
+        latencies.append(time.perf_counter() - t)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(i):
+        async with semaphore:
+            await timed(i)
+
+    await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+    report(f"concurrent x{args.concurrency}", latencies, wall=time.perf_counter() - start)
+    if args.metrics:
+        print(metrics.render())
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-request overhead of the agent graph.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--metrics", action="store_true", help="Print the /metrics output after the run.")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
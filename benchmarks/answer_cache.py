@@ -0,0 +1,76 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from RAG.answer_cache import SemanticAnswerCache
+from RAG.embeddings import create_embeddings
+
+# Hit rate, wrong-answer rate and lookup latency of the semantic answer
+# cache over a stream of questions whose popularity follows a Zipf
+# distribution. With --questions (CSV with question and group columns, one
+# group per set of paraphrases) the questions are embedded with the
+# configured provider. Otherwise every request is a fresh synthetic
+# phrasing (topic vector plus noise), and topics come in sibling pairs that
+# are close but need different answers, like § 4 vs § 5 of one law.
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+def synthetic_stream(topics, requests, dim, noise, sibling, rng):
+    base = normalize(rng.standard_normal((topics // 2, dim)).astype(np.float32))
+    offsets = normalize(rng.standard_normal((topics // 2, 2, dim)).astype(np.float32))
+    centers = normalize(base[:, None, :] + sibling * offsets).reshape(-1, dim)
+    weights = 1.0 / np.arange(1, len(centers) + 1)
+    labels = rng.choice(len(centers), requests, p=weights / weights.sum())
+    distance = noise * rng.uniform(0.4, 1.6, (requests, 1)).astype(np.float32)
+    vectors = normalize(centers[labels] + distance * normalize(rng.standard_normal((requests, dim)).astype(np.float32)))
+    return ["question"] * requests, labels, vectors
+
+def csv_stream(path, requests, rng):
+    frame = pd.read_csv(path)
+    vectors = np.array(create_embeddings().embed_documents(frame["question"].tolist()), dtype=np.float32)
+    groups = frame["group"].to_numpy()
+    unique = np.unique(groups)
+    weights = 1.0 / np.arange(1, len(unique) + 1)
+    picked = rng.choice(unique, requests, p=weights / weights.sum())
+    rows = [rng.choice(np.flatnonzero(groups == g)) for g in picked]
+    return frame["question"].iloc[rows].tolist(), groups[rows], vectors[rows]
+
+def run(questions, labels, vectors, threshold, max_entries):
+    cache = SemanticAnswerCache(threshold=threshold, max_entries=max_entries)
+    wrong = 0
+    for question, label, vector in zip(questions, labels, vectors):
+        answer, _ = cache.lookup(question, vector)
+        if answer is None:
+            cache.store(question, vector, label)
+        elif answer != label:
+            wrong += 1
+    return cache.stats(), wrong
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the semantic answer cache.")
+    parser.add_argument("--questions", default=None, help="CSV with question,group columns.")
+    parser.add_argument("--topics", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--noise", type=float, default=0.25, help="Mean paraphrase distance from the topic vector.")
+    parser.add_argument("--sibling", type=float, default=0.25, help="Distance between sibling topics.")
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--max-entries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.9, 0.93, 0.95, 0.97])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.questions:
+        questions, labels, vectors = csv_stream(args.questions, args.requests, rng)
+    else:
+        questions, labels, vectors = synthetic_stream(args.topics, args.requests, args.dim, args.noise, args.sibling, rng)
+    print(f"{args.requests} requests over {len(np.unique(labels))} topics, cache of {args.max_entries} entries")
+    for threshold in args.threshold:
+        start = time.perf_counter()
+        stats, wrong = run(questions, labels, vectors, threshold, args.max_entries)
+        print(f"  threshold {threshold:.2f}: hit rate {stats['hit_rate']:6.1%}  wrong answers {wrong / args.requests:6.2%}  "
+              f"lookup p50 {stats['lookup_p50_ms']:.3f} ms p99 {stats['lookup_p99_ms']:.3f} ms  "
+              f"{stats['evictions']} evictions  ({time.perf_counter() - start:.1f} s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import time
+import asyncio
+import argparse
+import pandas as pd
+from langchain_openai import AzureChatOpenAI
+import create_triplets
+from create_triplets import ExtractionScheduler, throughput_report
+from RAG.llm_cache import CachedChatModel, NullLLMCache
+
+# Compares single-chunk and batched extraction on the same chunks: tokens
+# per triple, triples per second, request count and how many chunks had to
+# fall back to single calls. Runs against whatever AZURE_OPENAI_ENDPOINT
+# points at, e.g. benchmarks.fake_llm_server:
+#   python -m benchmarks.fake_llm_server --latency 0.3 --token-latency 0.01 --rpm 100000 --throttle-rate 0 &
+#   AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089 AZURE_OPENAI_API_KEY=fake \
+#       python -m benchmarks.batched_extraction --chunks all_chunks.csv --limit 200
+
+def create_llm(max_tokens):
+    return CachedChatModel(AzureChatOpenAI(
+        azure_deployment="gpt-4o-mini",
+        api_version="2024-12-01-preview",
+        temperature=0,
+        max_tokens=max_tokens,
+        timeout=30,
+        max_retries=0,
+    ), cache=NullLLMCache())
+
+def run_mode(rows, args, batch_tokens):
+    scheduler = ExtractionScheduler(
+        create_llm(args.max_tokens), rpm=args.rpm, tpm=args.tpm, initial_concurrency=args.concurrency,
+        max_concurrency=args.concurrency, max_tokens=args.max_tokens, batch_tokens=batch_tokens,
+        batch_max_chunks=args.batch_max_chunks,
+    )
+    start = time.perf_counter()
+    asyncio.run(scheduler.run(iter(rows), lambda row, result: None))
+    return throughput_report(scheduler.stats, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched against single-chunk triple extraction.")
+    parser.add_argument("--chunks", default="all_chunks.csv")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--batch-tokens", type=int, nargs="+", default=[2000, 6000])
+    parser.add_argument("--batch-max-chunks", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=1000)
+    parser.add_argument("--tpm", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    rows = [row for _, row in pd.read_csv(args.chunks).head(args.limit).iterrows()]
+    print(f"{len(rows)} chunks from {args.chunks}, prompt version {create_triplets.PROMPT_VERSION}")
+    modes = [("single", 0)] + [(f"batched {b}", b) for b in args.batch_tokens]
+    print(f"  {'mode':<14} {'requests':>8} {'triples':>8} {'tok/triple':>10} {'triples/s':>10}"
+          f" {'truncated':>9} {'fallback':>8}")
+    for name, batch_tokens in modes:
+        r = run_mode(rows, args, batch_tokens)
+        tokens_per_triple = f"{r['tokens_per_triple']:.1f}" if r['tokens_per_triple'] else "-"
+        triples_per_second = f"{r['triples_per_second']:.1f}" if r['triples_per_second'] else "-"
+        print(f"  {name:<14} {r['requests']:>8} {r['triples']:>8} {tokens_per_triple:>10} {triples_per_second:>10}"
+              f" {r['truncated']:>9} {r['fallback_chunks']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+import fitz  # PyMuPDF
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from process_pdf import PageCleaner
+
+def reference_clean(page_texts):
+    # The original extract_clean_text_from_pdf body, minus PDF parsing.
+    text = ""
+    for raw_text in page_texts:
+        raw_text = re.sub(r"^\s*strana \d+", "", raw_text, flags=re.MULTILINE)
+        raw_text = re.sub(r"^\d+\s+ZÁKON.*", "", raw_text, flags=re.MULTILINE)
+        text += raw_text + "\n"
+    cleaned_text = re.sub(r"\n{2,}", "\n", text)
+    cleaned_text = re.sub(r" +", " ", cleaned_text)
+    return cleaned_text.strip()
+
+def best_of(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page cleaning over the bundled PDFs.")
+    parser.add_argument("--input-glob", default="e-sbirka_data/e-sbirka_data/*.pdf")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    pdf_paths = sorted(glob.glob(args.input_glob))
+    documents = []
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            documents.append([page.get_text() for page in doc])
+    total_bytes = sum(len(t.encode("utf-8")) for pages in documents for t in pages)
+
+    cleaner = PageCleaner()
+    for pdf_path, pages in zip(pdf_paths, documents):
+        if reference_clean(pages) != cleaner.clean_document(pages):
+            raise SystemExit(f"Output differs for {pdf_path}")
+
+    reference = best_of(lambda: [reference_clean(pages) for pages in documents], args.repeats)
+    compiled = best_of(lambda: [cleaner.clean_document(pages) for pages in documents], args.repeats)
+    print(f"{len(pdf_paths)} PDFs, {sum(map(len, documents))} pages, {total_bytes / 1e6:.1f} MB text "
+          f"(compatibility output byte-identical)")
+    print(f"  cleaning only  reference {reference * 1e3:8.1f} ms   compiled {compiled * 1e3:8.1f} ms   "
+          f"({reference / compiled:.2f}x)")
+
+    layout = PageCleaner(layout=True)
+    for name, fn in [("text", lambda: [cleaner.extract(p) for p in pdf_paths]),
+                     ("layout", lambda: [layout.extract(p) for p in pdf_paths])]:
+        print(f"  end-to-end {name:<7} {best_of(fn, 1) * 1e3:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import time
+import random
+import argparse
+import statistics
+from qdrant_rag import build_documents_from_csv
+from RAG.local_graph import LocalGraph
+from RAG.context import assemble_context
+
+# Prompt tokens of the final_node context: the old str(docs) against the
+# budgeted assembly, for KG answers of random entities (k_hop over a graph
+# snapshot or CSV) plus five chunks, two of them neighbours that share the
+# splitter overlap and one retrieved twice.
+
+def sample_requests(graph, docs, count, hops, limit, rng):
+    names = [graph.entities[i] for i in range(len(graph.entities))]
+    requests = []
+    while len(requests) < count:
+        name = rng.choice(names)
+        records = graph.k_hop([name], hops=hops, limit=limit)
+        if not records:
+            continue
+        start = rng.randrange(len(docs) - 1)
+        chunks = [docs[start], docs[start + 1]] + rng.sample(docs, 2)
+        chunks.append(chunks[0])
+        requests.append((f"Co upravuje {name}?", records, chunks))
+    return requests
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark token-budgeted context assembly.")
+    parser.add_argument("--graph", default="extract_KG.csv", help="Triples CSV or LocalGraph snapshot directory.")
+    parser.add_argument("--csv", default="all_chunks.csv", help="Chunk CSV.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--hops", type=int, default=2)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--budget", type=int, nargs="+", default=[2000, 4000, 6000])
+    args = parser.parse_args()
+
+    graph = LocalGraph.open(args.graph)
+    docs = build_documents_from_csv(args.csv)
+    requests = sample_requests(graph, docs, args.requests, args.hops, args.limit, random.Random(0))
+    print(f"{len(requests)} requests, mean {statistics.mean(len(r[1]) for r in requests):.0f} KG records, 5 chunks")
+    for budget in args.budget:
+        stats, latencies = [], []
+        for question, records, chunks in requests:
+            start = time.perf_counter()
+            stats.append(assemble_context(question, records, chunks, budget=budget)[1])
+            latencies.append(time.perf_counter() - start)
+        raw = statistics.mean(s["raw_tokens"] for s in stats)
+        context = statistics.mean(s["context_tokens"] for s in stats)
+        print(f"  budget {budget:>5}: raw {raw:7.0f} -> {context:6.0f} tokens ({1 - context / raw:5.1%} saved), "
+              f"max {max(s['context_tokens'] for s in stats)}, "
+              f"{statistics.mean(s['chunks_duplicate'] for s in stats):.1f} duplicate / "
+              f"{statistics.mean(s['chunks_dropped'] for s in stats):.1f} dropped chunks, "
+              f"{statistics.mean(s['kg_subjects_dropped'] for s in stats):.1f} KG subjects dropped, "
+              f"p50 {statistics.median(latencies) * 1e3:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import time
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import statistics
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from RAG.embeddings import LocalEmbeddings, EmbeddingCache, CachedEmbeddings, BatchingEmbeddings
+
+# Query embedding latency under concurrency with and without micro-batching,
+# cold vs warm EmbeddingCache, and the size/accuracy of the cache dtypes.
+# Runs a fastembed model with --model, otherwise a synthetic model whose
+# calls cost a fixed overhead plus a per-text time, like an ONNX session.
+
+class SyntheticEmbeddings(Embeddings):
+    def __init__(self, dim=384, call_cost=0.004, text_cost=0.0003):
+        self.dim = dim
+        self.call_cost = call_cost
+        self.text_cost = text_cost
+        self.calls = 0
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.call_cost + self.text_cost * len(texts))
+        return [self.vector(t).tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+async def timed_queries(embeddings, queries, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(query):
+        async with semaphore:
+            start = time.perf_counter()
+            await embeddings.aembed_query(query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    return latencies, time.perf_counter() - start
+
+def report(label, latencies, elapsed):
+    print(f"  {label:<28} p50 {statistics.median(latencies) * 1e3:7.2f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1e3:7.2f} ms  {len(latencies) / elapsed:8.0f} q/s")
+
+async def bench_batching(model, queries, concurrency):
+    print(f"Micro-batching, {len(queries)} queries at concurrency {concurrency}:")
+    report("direct", *await timed_queries(model, queries, concurrency))
+    batching = BatchingEmbeddings(model)
+    report("BatchingEmbeddings", *await timed_queries(batching, queries, concurrency))
+    print(f"  mean batch size {batching.stats()['mean_batch_size']:.1f}")
+
+def bench_cache(model, texts, root):
+    print(f"EmbeddingCache over {len(texts)} chunks:")
+    cached = CachedEmbeddings(model, EmbeddingCache(os.path.join(root, "cache.sqlite")), "bench")
+    for label in ("cold", "warm"):
+        start = time.perf_counter()
+        for i in range(0, len(texts), 256):
+            cached.embed_documents(texts[i:i + 256])
+        print(f"  {label:<5} {time.perf_counter() - start:7.2f} s")
+    print(f"  hit rate {cached.stats()['hit_rate']:.1%}")
+
+def bench_dtypes(model, texts, root):
+    print("Cache dtypes:")
+    exact = np.array(model.embed_documents(texts[:500]), dtype=np.float32)
+    for dtype in ("float32", "float16", "int8"):
+        cache = EmbeddingCache(os.path.join(root, f"{dtype}.sqlite"), dtype=dtype)
+        keys = [str(i) for i in range(len(exact))]
+        cache.set_many(zip(keys, exact))
+        found = cache.get_many(keys)
+        stored = np.array([found[k] for k in keys], dtype=np.float32)
+        cosine = np.sum(stored * exact, axis=1) / (np.linalg.norm(stored, axis=1) * np.linalg.norm(exact, axis=1))
+        print(f"  {dtype:<8} {cache.stats()['size_bytes'] / len(keys):7.0f} B/vector  "
+              f"min cosine to float32 {cosine.min():.6f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding batching and caching.")
+    parser.add_argument("--model", default=None, help="fastembed model name; synthetic model if omitted.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--chunks", type=int, default=5000)
+    args = parser.parse_args()
+
+    model = LocalEmbeddings(args.model) if args.model else SyntheticEmbeddings()
+    queries = [f"Jaké jsou povinnosti stavebníka podle § {i} stavebního zákona?" for i in range(args.queries)]
+    texts = [f"§ {i} Stavebník je povinen zajistit, aby stavba byla prováděna v souladu s povolením. " * 4
+             for i in range(args.chunks)]
+    asyncio.run(bench_batching(model, queries, args.concurrency))
+    with tempfile.TemporaryDirectory() as root:
+        bench_cache(model, texts, root)
+        bench_dtypes(model, texts, root)
+
+if __name__ == "__main__":
+    main()
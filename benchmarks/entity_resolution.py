@@ -0,0 +1,101 @@
+import time
+import random
+import argparse
+import statistics
+import pandas as pd
+from RAG.local_graph import LocalGraph
+from RAG.entity_index import EntityIndex, fold
+
+# Recall and latency of keyword -> entity name resolution. Keywords are
+# entity names perturbed the way LLM-generated Cypher keywords differ from
+# stored names (missing diacritics, capitalisation, a different case
+# ending, typos), plus an optional CSV of real `keyword,expected` pairs.
+
+LEGAL_KEYWORDS = [
+    "elektronický podpis", "stavební povolení", "daň poplatníka", "Poplatník daně z příjmů",
+    "zivnostensky zakon", "územní plán", "stavebník", "insolvenční správce",
+    "obecní úřad", "katastr nemovitostí", "společenství vlastníků", "kolaudační souhlas",
+]
+
+CASE_ENDINGS = [("í", "ího"), ("ý", "ého"), ("a", "y"), ("e", "i"), ("o", "a"), ("ost", "osti")]
+
+def inflect(name):
+    words = name.split()
+    last = words[-1]
+    for ending, replacement in CASE_ENDINGS:
+        if last.endswith(ending):
+            words[-1] = last[:-len(ending)] + replacement
+            return " ".join(words)
+    words[-1] = last + "u"
+    return " ".join(words)
+
+def typo(name, rng):
+    if len(name) < 6:
+        return name + name[-1]
+    i = rng.randrange(1, len(name) - 1)
+    return name[:i] + name[i + 1:]
+
+def make_queries(names, count, rng):
+    candidates = [n for n in names if 4 <= len(n) <= 60]
+    variants = {
+        "no diacritics": fold,
+        "capitalised": lambda n: n[:1].upper() + n[1:],
+        "case ending": inflect,
+        "typo": lambda n: typo(n, rng),
+    }
+    queries = []
+    for name in rng.sample(candidates, min(count, len(candidates))):
+        for kind, variant in variants.items():
+            queries.append((kind, variant(name), name))
+    return queries
+
+def evaluate(queries, resolve, k):
+    by_kind = {}
+    latencies = []
+    for kind, keyword, expected in queries:
+        start = time.perf_counter()
+        found = resolve(keyword, k)
+        latencies.append(time.perf_counter() - start)
+        hits = by_kind.setdefault(kind, [0, 0, 0])
+        hits[0] += bool(found) and found[0] == expected
+        hits[1] += expected in found
+        hits[2] += 1
+    return by_kind, latencies
+
+def report(name, by_kind, latencies, k):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name}: p50 {statistics.median(latencies) * 1e3:.3f} ms  p99 {p99 * 1e3:.3f} ms")
+    for kind, (top1, topk, total) in by_kind.items():
+        print(f"  {kind:<14} recall@1 {top1 / total:6.1%}  recall@{k} {topk / total:6.1%}  ({total} queries)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy entity resolution.")
+    parser.add_argument("--csv", default="extract_KG.csv", help="Triples CSV or LocalGraph snapshot directory.")
+    parser.add_argument("--queries", default=None, help="Optional CSV with keyword,expected columns.")
+    parser.add_argument("--samples", type=int, default=500, help="Entities to perturb into synthetic queries.")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    graph = LocalGraph.open(args.csv)
+    names = [graph.entities[i] for i in range(len(graph.entities))]
+    start = time.perf_counter()
+    index = EntityIndex(names)
+    print(f"Index over {len(names)} names built in {(time.perf_counter() - start) * 1e3:.0f} ms, "
+          f"{len(index.trigram_ids)} trigrams")
+
+    rng = random.Random(0)
+    queries = make_queries(names, args.samples, rng)
+    if args.queries:
+        queries += [("labelled", row.keyword, row.expected) for row in pd.read_csv(args.queries).itertuples()]
+
+    exact = set(names)
+    report("exact name match", *evaluate(queries, lambda kw, k: [kw] if kw in exact else [], args.k), args.k)
+    report("entity index", *evaluate(queries, index.resolve, args.k), args.k)
+
+    print("Legal keywords:")
+    for keyword in LEGAL_KEYWORDS:
+        print(f"  {keyword!r:<28} -> {index.resolve(keyword, 3)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import deque
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Minimal Azure OpenAI chat-completions stand-in for exercising the
+# extraction scheduler: injects latency, random 429s and a server-side
+# requests-per-minute limit. Batched extraction prompts ("### CHUNK <id>"
+# headings) get a JSON object keyed by chunk id, and latency grows with the
+# number of completion tokens like a real decoder. Point the client at it with
+#   AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089 AZURE_OPENAI_API_KEY=fake
+
+CHUNK_HEADING_RE = re.compile(r"^### CHUNK (\S+)$", re.MULTILINE)
+TRIPLE_COMPLETION_TOKENS = 30
+
+def fake_triple(text):
+    words = [w for w in text.split() if w.isalpha()][:4]
+    return {"subject": "tento zákon", "predicate": "upravuje", "object": " ".join(words).lower()}
+
+def fake_completion(text, max_tokens):
+    # Returns (content, completion_tokens, finish_reason).
+    parts = CHUNK_HEADING_RE.split(text)
+    if len(parts) > 1:
+        chunk_ids, bodies = parts[1::2], parts[2::2]
+        answer = {chunk_id: [fake_triple(body)] for chunk_id, body in zip(chunk_ids, bodies)}
+    else:
+        chunk_ids, answer = [None], [fake_triple(text)]
+    content = json.dumps(answer, ensure_ascii=False)
+    completion_tokens = TRIPLE_COMPLETION_TOKENS * len(chunk_ids)
+    if max_tokens and completion_tokens > max_tokens:
+        return content[:len(content) * max_tokens // completion_tokens], max_tokens, "length"
+    return content, completion_tokens, "stop"
+
+def create_app(latency=0.5, jitter=0.5, rpm=600, throttle_rate=0.02, timeout_rate=0.0, hang_seconds=120.0,
+               token_latency=0.0):
+    app = FastAPI()
+    window = deque()
+    app.state.stats = {"requests": 0, "ok": 0, "throttled": 0, "hung": 0, "max_in_flight": 0, "in_flight": 0}
+
+    def throttled(retry_after):
+        app.state.stats["throttled"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": f"{retry_after:.2f}"},
+            content={"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+        )
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        stats = app.state.stats
+        stats["requests"] += 1
+        now = time.monotonic()
+        while window and now - window[0] > 60:
+            window.popleft()
+        if len(window) >= rpm:
+            return throttled(60 - (now - window[0]))
+        window.append(now)
+        if random.random() < throttle_rate:
+            return throttled(random.uniform(0.5, 2.0))
+
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            if random.random() < timeout_rate:
+                stats["hung"] += 1
+                await asyncio.sleep(hang_seconds)
+            content, completion_tokens, finish_reason = fake_completion(
+                body["messages"][-1]["content"], body.get("max_tokens") or body.get("max_completion_tokens"))
+            await asyncio.sleep(max(0.0, random.gauss(latency, latency * jitter)) + token_latency * completion_tokens)
+        finally:
+            stats["in_flight"] -= 1
+
+        stats["ok"] += 1
+        prompt_tokens = sum(len(m["content"]) // 4 for m in body["messages"])
+        return {
+            "id": f"chatcmpl-fake-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Azure OpenAI server with latency and throttling.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean response latency in seconds.")
+    parser.add_argument("--rpm", type=int, default=600, help="Server-side requests-per-minute limit.")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="Probability of a random 429.")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Probability a request hangs.")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Extra seconds per completion token.")
+    args = parser.parse_args()
+    app = create_app(latency=args.latency, rpm=args.rpm, throttle_rate=args.throttle_rate,
+                     timeout_rate=args.timeout_rate, token_latency=args.token_latency)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
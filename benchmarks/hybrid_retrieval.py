@@ -0,0 +1,96 @@
+import re
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from qdrant_rag import build_documents_from_csv
+from RAG.lexical_index import LexicalIndex, SECTION_HEADING_RE, reciprocal_rank_fusion
+from RAG.local_vector import LocalVectorStore
+from RAG.embeddings import create_embeddings
+
+# Hit@k and latency of BM25, dense and RRF-fused retrieval over the chunk
+# CSV. Queries come from the chunks themselves: "§ N <law>" lookups for
+# chunks that open a section, and phrases cut from chunk sentences. The
+# dense and hybrid rows need --store, a LocalVectorStore over the same CSV.
+
+SENTENCE_RE = re.compile(r"[^.;:\n]{60,200}")
+SHORT_NAME_RE = re.compile(r"\(([^)]+)\)\s*$")
+
+def short_law_name(header):
+    # "..., o živnostenském podnikání (živnostenský zákon)" -> "živnostenský zákon"
+    name = header.split(",")[-1].strip()
+    match = SHORT_NAME_RE.search(name)
+    return match.group(1) if match else name
+
+def make_queries(docs, count, rng):
+    sections, phrases = [], []
+    for doc in rng.sample(docs, min(count, len(docs))):
+        text = doc.page_content
+        headings = SECTION_HEADING_RE.findall(text)
+        if headings:
+            sections.append((f"§ {headings[0]} {short_law_name(doc.metadata['header'])}", text))
+        sentences = SENTENCE_RE.findall(text)
+        if sentences:
+            words = rng.choice(sentences).split()
+            start = rng.randrange(max(1, len(words) - 6))
+            phrases.append((" ".join(words[start:start + 6]), text))
+    return {"§ lookup": sections, "phrase": phrases}
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return f"p50 {statistics.median(latencies) * 1e3:7.3f} ms  p99 {p99 * 1e3:7.3f} ms"
+
+def evaluate(label, queries, retrieve, k):
+    hits = answered = 0
+    latencies = []
+    for query, expected in queries:
+        start = time.perf_counter()
+        found = retrieve(query)
+        latencies.append(time.perf_counter() - start)
+        hits += expected in found[:k]
+        answered += bool(found)
+    print(f"  {label:<22} hit@{k} {hits / len(queries):6.1%}  answered {answered / len(queries):6.1%}  "
+          f"{percentiles(latencies)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BM25 + dense hybrid retrieval.")
+    parser.add_argument("--csv", default="all_chunks.csv")
+    parser.add_argument("--store", default=None, help="LocalVectorStore built from the same CSV.")
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = build_documents_from_csv(args.csv)
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        lexical = LexicalIndex.from_documents(docs, root)
+        print(f"BM25 index over {len(docs)} chunks built in {time.perf_counter() - start:.1f} s: "
+              f"{lexical.config['terms']} terms, {lexical.config['postings']} postings")
+        store = LocalVectorStore(args.store, embedding=create_embeddings()) if args.store else None
+
+        def bm25(query):
+            return [d.page_content for d in lexical.similarity_search(query, args.candidates)]
+
+        def section(query):
+            return [d.page_content for d in lexical.section_lookup(query, args.k) or []]
+
+        def dense(query):
+            return [d.page_content for d in store.similarity_search(query, args.candidates)]
+
+        def hybrid(query):
+            return reciprocal_rank_fusion([dense(query), bm25(query)])
+
+        for kind, queries in make_queries(docs, args.samples, random.Random(0)).items():
+            print(f"{kind} ({len(queries)} queries):")
+            if kind == "§ lookup":
+                evaluate("section_lookup", queries, section, args.k)
+            evaluate("bm25", queries, bm25, args.k)
+            if store is not None:
+                evaluate("dense", queries, dense, args.k)
+                evaluate("hybrid (rrf)", queries, hybrid, args.k)
+
+if __name__ == "__main__":
+    main()
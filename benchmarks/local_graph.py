@@ -0,0 +1,61 @@
+import io
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import statistics
+from kg_to_neo4j import load_triples_from_csv, normalize_and_deduplicate_triples
+from RAG.local_graph import LocalGraph
+
+# Build, snapshot and open times of the in-process graph, and 1-hop /
+# k-hop lookup latency for random entities.
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return f"p50 {statistics.median(latencies) * 1e6:8.1f} us  p99 {p99 * 1e6:8.1f} us"
+
+def time_lookups(names, lookup):
+    latencies = []
+    results = 0
+    for name in names:
+        start = time.perf_counter()
+        results += len(lookup(name))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results / len(names)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the embedded LocalGraph backend.")
+    parser.add_argument("--csv", default="extract_KG.csv")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--hops", type=int, default=2)
+    parser.add_argument("--limit", type=int, default=200, help="Edge limit for k-hop lookups.")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = normalize_and_deduplicate_triples(load_triples_from_csv(args.csv))
+    start = time.perf_counter()
+    graph = LocalGraph.from_triples(df)
+    print(f"{graph.stats()}")
+    print(f"  build from {len(df)} triples   {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        graph.save(out_dir)
+        print(f"  save snapshot             {(time.perf_counter() - start) * 1e3:8.1f} ms")
+        start = time.perf_counter()
+        mapped = LocalGraph.load(out_dir)
+        print(f"  open snapshot (mmap)      {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+        rng = random.Random(0)
+        names = [mapped.entities[rng.randrange(len(mapped.entities))] for _ in range(args.lookups)]
+        for label, g in (("in-memory", graph), ("mmap", mapped)):
+            latencies, avg = time_lookups(names, g.neighbours)
+            print(f"  1-hop {label:<10} {percentiles(latencies)}  {avg:6.1f} edges/lookup")
+            latencies, avg = time_lookups(names, lambda n: g.k_hop([n], hops=args.hops, limit=args.limit))
+            print(f"  {args.hops}-hop {label:<10} {percentiles(latencies)}  {avg:6.1f} edges/lookup")
+        del mapped
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import time
+import asyncio
+import argparse
+from RAG.metrics import Metrics
+
+# Cost of the per-stage instrumentation itself: one timed stage (sync and
+# async, with a result size and LLM usage attached) and one /metrics
+# render over the stage series a busy process accumulates.
+
+STAGES = ("router_local", "router", "text2cypher", "entity_resolution", "cypher", "section_lookup", "rewrite",
+          "embedding", "vector_search", "lexical_search", "context", "final_llm", "answer_cache", "pipeline")
+
+class Usage:
+    usage_metadata = {"input_tokens": 1200, "output_tokens": 300, "total_tokens": 1500}
+
+def sync_stages(metrics, calls):
+    for i in range(calls):
+        with metrics.stage(STAGES[i % len(STAGES)]) as stage:
+            stage.results(5)
+            stage.usage(Usage)
+
+async def async_stages(metrics, calls):
+    for i in range(calls):
+        async with metrics.stage(STAGES[i % len(STAGES)]) as stage:
+            stage.results(5)
+            stage.usage(Usage)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the overhead of the stage metrics.")
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--renders", type=int, default=200)
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    start = time.perf_counter()
+    sync_stages(metrics, args.calls)
+    print(f"  sync stage    {(time.perf_counter() - start) / args.calls * 1e6:7.2f} us per call")
+    start = time.perf_counter()
+    asyncio.run(async_stages(metrics, args.calls))
+    print(f"  async stage   {(time.perf_counter() - start) / args.calls * 1e6:7.2f} us per call")
+    start = time.perf_counter()
+    for _ in range(args.renders):
+        text = metrics.render()
+    print(f"  render        {(time.perf_counter() - start) / args.renders * 1e3:7.2f} ms for {text.count(chr(10))} lines")
+
+if __name__ == "__main__":
+    main()
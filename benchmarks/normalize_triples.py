@@ -0,0 +1,62 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import pandas as pd
+from kg_to_neo4j import (
+    load_triples_from_csv,
+    normalize_and_deduplicate_triples,
+    normalize_and_deduplicate_triples_rowwise,
+    normalize_and_deduplicate_triples_streaming,
+)
+
+def timed(fn, *args, repeats=3, **kwargs):
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            best = min(best, time.perf_counter() - start)
+    return result, best, out.getvalue().strip().splitlines()[-1]
+
+def stream_to_frame(csv_path, chunksize):
+    return pd.concat(normalize_and_deduplicate_triples_streaming(csv_path, chunksize=chunksize), ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark triple normalization implementations.")
+    parser.add_argument("--csv", default="extract_KG.csv")
+    parser.add_argument("--scale", type=int, default=1, help="Repeat the input this many times.")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    triples_df = load_triples_from_csv(args.csv)
+    if args.scale > 1:
+        triples_df = pd.concat([triples_df] * args.scale, ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "triples.csv")
+        triples_df.to_csv(csv_path, index=False)
+
+        rowwise, rowwise_time, rowwise_summary = timed(
+            normalize_and_deduplicate_triples_rowwise, triples_df, repeats=args.repeats)
+        vectorized, vectorized_time, vectorized_summary = timed(
+            normalize_and_deduplicate_triples, triples_df, repeats=args.repeats)
+        streamed, streamed_time, streamed_summary = timed(
+            stream_to_frame, csv_path, args.chunksize, repeats=args.repeats)
+
+    for name, frame, summary in [("vectorized", vectorized, vectorized_summary),
+                                 ("streaming", streamed, streamed_summary)]:
+        pd.testing.assert_frame_equal(rowwise.astype(object), frame.astype(object))
+        assert summary == rowwise_summary, f"{name}: {summary!r} != {rowwise_summary!r}"
+
+    print(f"{len(triples_df)} input rows -> {len(rowwise)} unique triples (outputs and counts identical)")
+    print(f"  rowwise    {rowwise_time * 1000:9.1f} ms")
+    print(f"  vectorized {vectorized_time * 1000:9.1f} ms  ({rowwise_time / vectorized_time:.1f}x)")
+    print(f"  streaming  {streamed_time * 1000:9.1f} ms  ({rowwise_time / streamed_time:.1f}x, includes CSV parsing)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import pandas as pd
+from langchain_core.messages import HumanMessage
+from RAG.router import LocalRouter, parse_route, is_confident, ROUTER_EXAMPLES_PATH, ROUTER_NONE_CONFIDENCE
+from RAG.prompt import router_prompt
+from RAG.clients import get_registry
+
+# Accuracy, coverage and latency of the local router against the LLM
+# router. Without --eval the labelled examples are scored by k-fold cross
+# validation, so every question is classified by a model that did not see
+# it. --llm also runs the current LLM router over the same questions and
+# reports the combined local + LLM fallback pipeline. A local "none" must
+# also clear --none-threshold; "skipped rag" counts legal questions the
+# local router would answer without retrieval.
+
+def percentiles(latencies, scale=1e3, unit="ms"):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return f"p50 {statistics.median(latencies) * scale:8.3f} {unit}  p99 {p99 * scale:8.3f} {unit}"
+
+def local_predictions(train, evaluate, folds):
+    # Returns [(question, label, route, confidence, seconds)].
+    if evaluate is not None:
+        splits = [(train, evaluate)]
+    else:
+        rows = list(train)
+        random.Random(0).shuffle(rows)
+        splits = [([r for j, r in enumerate(rows) if j % folds != i], rows[i::folds]) for i in range(folds)]
+    results = []
+    for train_rows, test_rows in splits:
+        router = LocalRouter(train_rows)
+        for question, label in test_rows:
+            start = time.perf_counter()
+            route, confidence = router.predict(question)
+            results.append((question, label, route, confidence, time.perf_counter() - start))
+    return results
+
+async def llm_predictions(questions):
+    clients = await get_registry()
+    results = {}
+    for question in questions:
+        start = time.perf_counter()
+        response = await clients.llm.ainvoke([HumanMessage(content=router_prompt.replace("<input_replace>", question))])
+        results[question] = (parse_route(response.content), time.perf_counter() - start)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local router against the LLM router.")
+    parser.add_argument("--train", default=ROUTER_EXAMPLES_PATH, help="Labelled question,label CSV.")
+    parser.add_argument("--eval", default=None, help="Held-out question,label CSV; k-fold on --train if omitted.")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--none-threshold", type=float, nargs="+", default=[ROUTER_NONE_CONFIDENCE])
+    parser.add_argument("--llm", action="store_true", help="Also run the LLM router (needs Azure credentials).")
+    args = parser.parse_args()
+
+    load = lambda path: list(pd.read_csv(path)[["question", "label"]].itertuples(index=False, name=None))
+    results = local_predictions(load(args.train), load(args.eval) if args.eval else None, args.folds)
+    print(f"{len(results)} questions ({'held out' if args.eval else f'{args.folds}-fold'})")
+    print(f"  local router           accuracy {sum(r[1] == r[2] for r in results) / len(results):6.1%}  "
+          f"{percentiles([r[4] for r in results], 1e6, 'us')}")
+
+    llm = None
+    if args.llm:
+        llm = asyncio.run(llm_predictions([r[0] for r in results]))
+        print(f"  llm router             accuracy {sum(r[1] == llm[r[0]][0] for r in results) / len(results):6.1%}  "
+              f"{percentiles([seconds for _, seconds in llm.values()])}")
+
+    for threshold in args.threshold:
+        for none_threshold in args.none_threshold:
+            local = [is_confident(r[2], r[3], threshold, none_threshold) for r in results]
+            confident = [r for r, is_local in zip(results, local) if is_local]
+            skipped = sum(r[1] == "rag" and r[2] == "none" for r in confident)
+            line = (f"  threshold {threshold:.2f}/{none_threshold:.2f}: local covers {len(confident) / len(results):6.1%}"
+                    f" at accuracy {sum(r[1] == r[2] for r in confident) / max(1, len(confident)):6.1%}, skipped rag {skipped}")
+            if llm is not None:
+                routes = [r[2] if is_local else llm[r[0]][0] for r, is_local in zip(results, local)]
+                seconds = [r[4] + (0 if is_local else llm[r[0]][1]) for r, is_local in zip(results, local)]
+                line += (f", with LLM fallback accuracy {sum(r[1] == route for r, route in zip(results, routes)) / len(results):6.1%}"
+                         f" mean {statistics.mean(seconds) * 1e3:7.1f} ms")
+            print(line)
+
+if __name__ == "__main__":
+    main()
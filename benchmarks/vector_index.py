@@ -0,0 +1,75 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from RAG.local_vector import LocalVectorStore, normalize
+
+# QPS, recall@k against exact search and resident index memory for the
+# LocalVectorStore index types. Uses clustered synthetic vectors, or the
+# vectors of an existing store (--store) with held-out rows as queries.
+
+def synthetic(count, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    return centers[labels] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+
+def run(store, queries, k, truth=None):
+    found = []
+    start = time.perf_counter()
+    for q in queries:
+        found.append(store.search(q, k)[0])
+    elapsed = time.perf_counter() - start
+    recall = None
+    if truth is not None:
+        recall = np.mean([len(set(f.tolist()) & set(t.tolist())) / k for f, t in zip(found, truth)])
+    return len(queries) / elapsed, recall, found
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local vector index types.")
+    parser.add_argument("--store", default=None, help="Take vectors from an existing LocalVectorStore.")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.store:
+        vectors = np.array(LocalVectorStore(args.store).vectors)
+        rng.shuffle(vectors)
+        queries, vectors = vectors[:args.queries], vectors[args.queries:]
+        queries = queries + 0.01 * rng.standard_normal(queries.shape).astype(np.float32)
+    else:
+        data = synthetic(args.count + args.queries, args.dim, args.clusters, rng)
+        queries, vectors = data[:args.queries], data[args.queries:]
+    queries = normalize(queries)
+    texts = [""] * len(vectors)
+    metadatas = [{}] * len(vectors)
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, "
+          f"{vectors.nbytes / 2**20:.0f} MiB as float32")
+
+    configs = [
+        ("flat", {}, [{}]),
+        ("hnsw", {}, [{"ef_search": 16}, {"ef_search": 64}, {"ef_search": 128}]),
+        ("ivfpq", {}, [{"nprobe": 8, "rerank": 1}, {"nprobe": 8, "rerank": 10}, {"nprobe": 32, "rerank": 10}]),
+    ]
+    truth = None
+    with tempfile.TemporaryDirectory() as root:
+        for index_type, build_params, search_params in configs:
+            start = time.perf_counter()
+            store = LocalVectorStore.build(os.path.join(root, index_type), vectors, texts, metadatas,
+                                           index_type=index_type, **build_params)
+            build = time.perf_counter() - start
+            for params in search_params:
+                store.set_search_params(**params)
+                qps, recall, found = run(store, queries, args.k, truth)
+                if truth is None:
+                    truth, recall = found, 1.0
+                label = index_type + "".join(f" {k}={v}" for k, v in params.items())
+                print(f"  {label:<28} build {build:6.1f} s  {qps:8.0f} QPS  recall@{args.k} {recall:6.3f}"
+                      f"  index {store.memory_bytes() / 2**20:7.1f} MiB resident")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,15 @@
 import pandas as pd
 import json
 import re
+import os
+import sys
+import time
+import sqlite3
+import random
+import asyncio
+import hashlib
+import argparse
+import openai
 from langchain_core.messages import HumanMessage, SystemMessage
 from json_repair import repair_json
 from tqdm import tqdm
@@ -8,6 +17,10 @@ from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "app"))
+from RAG.llm_cache import CachedChatModel
+from RAG.tokens import get_encoder
+
 load_dotenv()
 
 extraction_system_prompt = """
@@ -44,23 +57,120 @@ Please extract Subject-Predicate-Object (S-P-O) triples from the text below.
 ```text
 {text_chunk}
 """
-def process_chunk(row):
-    chunk_text = row['text']
-    chunk_id = row['chunk_id']
 
-    chunk = f"{row['header']} {chunk_text}"
+extraction_batch_user_prompt_template = """
+Please extract Subject-Predicate-Object (S-P-O) triples from each of the text chunks below.
+
+ **MANDATORY RULES**
+1.  **JSON only:** return **exactly one** JSON object, nothing before or after.
+2.  Its keys are the chunk ids from the "### CHUNK <id>" headings; each value is the JSON array of triples extracted **only** from that chunk (use [] when a chunk has none).
+3.  Each triple has keys **"subject"**, **"predicate"**, **"object"** (all lowercase).
+4.  Keep **predicate** concise (≤ 3 words, prefer 1-2); use verbs like “upravuje”, “stanoví”, “považuje se”.
+5.  Replace pronouns/deictic phrases with their explicit referent (see system prompt).
+6.  When a single clause lists many objects, create **one triple per object**.
+7.  Omit non-factual or interpretative statements.
+
+**Chunks to process**
+{chunks}
+"""
+batch_chunk_template = """
+### CHUNK {chunk_id}
+```text
+{text_chunk}
+```
+"""
+PROMPT_VERSION = hashlib.sha256(
+    (extraction_system_prompt + extraction_user_prompt_template
+     + extraction_batch_user_prompt_template + batch_chunk_template).encode("utf-8")
+).hexdigest()[:12]
+
+def chunk_content_hash(row):
+    chunk = f"{row['header']} {row['text']}"
+    return hashlib.sha256(f"{PROMPT_VERSION}\x00{chunk}".encode("utf-8")).hexdigest()
+
+class ExtractionStore:
+    # Append-only SQLite log of process_chunk results keyed by chunk_id and
+    # a hash of the chunk text + prompt version. The latest entry per key wins.
+    def __init__(self, path="extraction_store.sqlite"):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chunk_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                triples TEXT NOT NULL,
+                error TEXT,
+                response TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_key ON results (chunk_id, content_hash, id)")
+        self.conn.commit()
+
+    def record(self, chunk_id, content_hash, result):
+        failed = result['failed']
+        self.conn.execute(
+            "INSERT INTO results (chunk_id, content_hash, status, triples, error, response, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                chunk_id,
+                content_hash,
+                'failed' if failed else 'ok',
+                json.dumps(result['triples'], ensure_ascii=False),
+                failed['error'] if failed else None,
+                failed['response'] if failed else None,
+                time.time(),
+            ),
+        )
+        self.conn.commit()
+
+    def latest(self):
+        rows = self.conn.execute("""
+            SELECT r.chunk_id, r.content_hash, r.status, r.triples, r.error, r.response
+            FROM results r
+            JOIN (SELECT MAX(id) AS id FROM results GROUP BY chunk_id, content_hash) l ON r.id = l.id
+        """)
+        return {(row[0], row[1]): row[2:] for row in rows}
+
+    def completed_keys(self):
+        return {key for key, (status, *_rest) in self.latest().items() if status == 'ok'}
+
+    def close(self):
+        self.conn.close()
+
+def build_messages(row):
+    chunk = f"{row['header']} {row['text']}"
     user_prompt = extraction_user_prompt_template.format(text_chunk=chunk)
+    return [
+        SystemMessage(content=extraction_system_prompt),
+        HumanMessage(content=user_prompt)
+    ]
+
+def build_batch_messages(rows):
+    chunks = "".join(
+        batch_chunk_template.format(chunk_id=row['chunk_id'], text_chunk=f"{row['header']} {row['text']}")
+        for row in rows
+    )
+    return [
+        SystemMessage(content=extraction_system_prompt),
+        HumanMessage(content=extraction_batch_user_prompt_template.format(chunks=chunks))
+    ]
+
+def process_chunk(row):
+    chunk_id = row['chunk_id']
     llm_output = None
 
     try:
-        messages = [
-            SystemMessage(content=extraction_system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
+        messages = build_messages(row)
         llm_output = llm.invoke(messages).content.strip()
     except Exception as e:
         return {'triples': [], 'failed': {'chunk_id': chunk_id, 'error': f'API/Processing Error: {str(e)}', 'response': ''}}
 
+    return parse_llm_output(chunk_id, llm_output)
+
+def parse_llm_output(chunk_id, llm_output):
     parsed_json = None
     parsing_error = None
     if llm_output is not None:
@@ -94,7 +204,9 @@ def process_chunk(row):
         if parsed_json is None:
             return {'triples': [], 'failed': {'chunk_id': chunk_id, 'error': f'Parsing Failed: {parsing_error}', 'response': llm_output}}
 
-    # Validate and Store Triples
+    return {'triples': validate_triples(chunk_id, parsed_json), 'failed': None}
+
+def validate_triples(chunk_id, parsed_json):
     valid_triples_in_chunk = []
     if parsed_json is not None and isinstance(parsed_json, list):
         for item in parsed_json:
@@ -102,46 +214,364 @@ def process_chunk(row):
                 if all(isinstance(item[k], str) for k in ['subject', 'predicate', 'object']):
                     item['chunk_id'] = chunk_id
                     valid_triples_in_chunk.append(item)
-    return {'triples': valid_triples_in_chunk, 'failed': None}
+    return valid_triples_in_chunk
 
+def parse_batch_output(chunk_ids, llm_output, truncated=False):
+    # Maps each chunk id whose key holds a list in the response to its
+    # result; missing, malformed or truncated entries are left out so the
+    # caller can re-extract those chunks on their own.
+    try:
+        parsed_data = json.loads(repair_json(llm_output))
+    except (json.JSONDecodeError, ValueError):
+        return {}
+    if not isinstance(parsed_data, dict):
+        return {}
+    parsed_data = {str(k).strip(): v for k, v in parsed_data.items()}
+    if truncated:
+        # repair_json closes a response cut off at max_tokens, so the last
+        # chunk in it looks like a complete (but partial) list.
+        present = [key for key in parsed_data if key in {str(chunk_id) for chunk_id in chunk_ids}]
+        if present:
+            del parsed_data[present[-1]]
+    results = {}
+    for chunk_id in chunk_ids:
+        value = parsed_data.get(str(chunk_id))
+        if isinstance(value, list):
+            results[chunk_id] = {'triples': validate_triples(chunk_id, value), 'failed': None}
+    return results
 
-if __name__ == "__main__":
-    llm = AzureChatOpenAI(
-            azure_deployment="gpt-4o-mini",  
-            api_version="2024-12-01-preview",
-            temperature=0,
-            max_tokens=200,
-            timeout=30,
-            max_retries=2,
-        )
-    MAX_WORKERS = 10
-    pf = pd.read_csv("all_chunks.csv")
-    all_extracted_triples = []
-    failed_chunks = []
+def estimate_tokens(messages, max_tokens):
+    # Prompt tokens plus the completion budget, as counted against TPM quotas.
+    enc = get_encoder()
+    return sum(len(enc.encode_ordinary(m.content)) + 4 for m in messages) + 3 + max_tokens
+
+def pack_batches(rows, budget_tokens, max_chunks=16):
+    # Greedily groups consecutive rows until their chunk text reaches the
+    # prompt token budget; a chunk larger than the budget goes alone.
+    enc = get_encoder()
+    batch = []
+    used = 0
+    for row in rows:
+        size = len(enc.encode_ordinary(f"{row['header']} {row['text']}")) + 16
+        if batch and (used + size > budget_tokens or len(batch) >= max_chunks):
+            yield batch
+            batch = []
+            used = 0
+        batch.append(row)
+        used += size
+    if batch:
+        yield batch
+
+def usage_tokens(response):
+    # Cache hits report zero usage and cost nothing.
+    usage = getattr(response, 'usage_metadata', None) or {}
+    return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+
+def is_truncated(response):
+    metadata = getattr(response, 'response_metadata', None) or {}
+    return metadata.get('finish_reason') == 'length'
+
+def throughput_report(stats, elapsed):
+    triples = stats['triples']
+    tokens = stats['prompt_tokens'] + stats['completion_tokens']
+    return {
+        'chunks': stats['chunks'],
+        'triples': triples,
+        'requests': stats['requests'],
+        'prompt_tokens': stats['prompt_tokens'],
+        'completion_tokens': stats['completion_tokens'],
+        'tokens_per_triple': tokens / triples if triples else None,
+        'triples_per_second': triples / elapsed if elapsed else None,
+        'truncated': stats['truncated'],
+        'fallback_chunks': stats['fallback_chunks'],
+    }
+
+class RateBudget:
+    # Token bucket refilled continuously at per_minute / 60 units per second.
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.available = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_row = {
-            executor.submit(process_chunk, row): row
-            for _, row in pf.iterrows()
-        }
+    async def acquire(self, amount):
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.available >= amount:
+                self.available -= amount
+                return
+            await asyncio.sleep((amount - self.available) / self.rate)
 
-        for future in tqdm(as_completed(future_to_row), total=len(future_to_row), desc="Extracting Triplets"):
-            row = future_to_row[future]
+class AdaptiveConcurrency:
+    # AIMD window: +1 per window of successes, halved on throttling or
+    # timeouts (at most once per cooldown so one burst of 429s counts once).
+    # Used as an async context manager, it holds one of the window's slots
+    # for the duration of a request.
+    def __init__(self, initial, minimum=1, maximum=64, cooldown=2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.last_decrease = 0.0
+        self.active = 0
+        self.changed = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.active < self.window)
+            self.active += 1
+        return self
+
+    async def __aexit__(self, kind, error, traceback):
+        async with self.changed:
+            self.active -= 1
+            self.changed.notify_all()
+        return False
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now - self.last_decrease >= self.cooldown:
+            self.limit = max(self.minimum, self.limit / 2)
+            self.last_decrease = now
+
+    @property
+    def window(self):
+        return max(self.minimum, int(self.limit))
+
+def retry_after_seconds(error):
+    response = getattr(error, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+class ExtractionScheduler:
+    # Streams rows through a bounded in-flight window sized by
+    # AdaptiveConcurrency, which also caps concurrent HTTP requests, paced
+    # by RPM/TPM budgets, with jittered exponential backoff on throttling
+    # and transient API errors.
+    # With batch_tokens set, consecutive chunks are packed into one request
+    # up to that many prompt tokens; chunks missing from a batched answer
+    # are re-extracted one by one.
+    def __init__(self, llm, rpm=1000, tpm=200_000, initial_concurrency=8, max_concurrency=64,
+                 max_attempts=5, timeout=60.0, backoff_base=1.0, backoff_cap=30.0, max_tokens=200,
+                 batch_tokens=0, batch_max_chunks=16, batch_max_output_tokens=16_000):
+        self.llm = llm
+        self.requests = RateBudget(rpm)
+        self.tokens = RateBudget(tpm)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, maximum=max_concurrency)
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_tokens = max_tokens
+        self.batch_tokens = batch_tokens
+        self.batch_max_chunks = batch_max_chunks
+        self.batch_max_output_tokens = batch_max_output_tokens
+        self.stats = {'requests': 0, 'throttled': 0, 'timeouts': 0, 'errors': 0, 'retries': 0,
+                      'chunks': 0, 'triples': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                      'truncated': 0, 'batches': 0, 'fallback_chunks': 0}
+
+    def backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    async def invoke(self, messages, max_tokens=None):
+        # Returns (response, None) or (None, error) once attempts run out.
+        # max_tokens overrides the model's completion budget for this call.
+        kwargs = {'max_tokens': max_tokens} if max_tokens else {}
+        estimate = estimate_tokens(messages, max_tokens or self.max_tokens)
+        error = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.stats['retries'] += 1
+            retry_after = None
             try:
-                result = future.result()
-                all_extracted_triples.extend(result['triples'])
-                if result['failed']:
-                    failed_chunks.append(result['failed'])
+                # Every request, including the per-chunk fallbacks of a
+                # batch, takes a concurrency slot and its RPM/TPM budget.
+                async with self.concurrency:
+                    await self.requests.acquire(1)
+                    await self.tokens.acquire(estimate)
+                    self.stats['requests'] += 1
+                    response = await asyncio.wait_for(self.llm.ainvoke(messages, **kwargs), self.timeout)
+            except openai.RateLimitError as e:
+                self.stats['throttled'] += 1
+                self.concurrency.on_throttle()
+                retry_after = retry_after_seconds(e)
+                error = f'Rate limited: {e}'
+            except (openai.APITimeoutError, asyncio.TimeoutError) as e:
+                self.stats['timeouts'] += 1
+                self.concurrency.on_throttle()
+                error = f'Timeout: {e!r}'
             except Exception as e:
-                failed_chunks.append({'chunk_id': row['chunk_id'], 'error': str(e), 'response': ''})
+                self.stats['errors'] += 1
+                error = f'API/Processing Error: {str(e)}'
+            else:
+                self.concurrency.on_success()
+                prompt_tokens, completion_tokens = usage_tokens(response)
+                self.stats['prompt_tokens'] += prompt_tokens
+                self.stats['completion_tokens'] += completion_tokens
+                self.stats['truncated'] += is_truncated(response)
+                return response, None
+            await asyncio.sleep(self.backoff(attempt, retry_after))
+        return None, error
+
+    async def process(self, row):
+        chunk_id = row['chunk_id']
+        response, error = await self.invoke(build_messages(row))
+        if response is None:
+            return {'triples': [], 'failed': {'chunk_id': chunk_id, 'error': error, 'response': ''}}
+        return parse_llm_output(chunk_id, response.content.strip())
+
+    async def process_batch(self, rows):
+        if len(rows) == 1:
+            return [await self.process(rows[0])]
+        self.stats['batches'] += 1
+        max_tokens = min(self.batch_max_output_tokens, self.max_tokens * len(rows))
+        response, _ = await self.invoke(build_batch_messages(rows), max_tokens)
+        chunk_ids = [row['chunk_id'] for row in rows]
+        parsed = parse_batch_output(chunk_ids, response.content, is_truncated(response)) if response is not None else {}
+        missing = [row for row in rows if row['chunk_id'] not in parsed]
+        self.stats['fallback_chunks'] += len(missing)
+        for row, result in zip(missing, await asyncio.gather(*(self.process(row) for row in missing))):
+            parsed[row['chunk_id']] = result
+        return [parsed[chunk_id] for chunk_id in chunk_ids]
+
+    async def run(self, rows, on_result):
+        in_flight = {}
+
+        async def drain(return_when):
+            done, _ = await asyncio.wait(in_flight, return_when=return_when)
+            for task in done:
+                batch = in_flight.pop(task)
+                try:
+                    results = task.result()
+                except Exception as e:
+                    results = [{'triples': [], 'failed': {'chunk_id': row['chunk_id'], 'error': str(e), 'response': ''}}
+                               for row in batch]
+                for row, result in zip(batch, results):
+                    self.stats['chunks'] += 1
+                    self.stats['triples'] += len(result['triples'])
+                    on_result(row, result)
+
+        batches = pack_batches(rows, self.batch_tokens, self.batch_max_chunks) if self.batch_tokens else ([row] for row in rows)
+        for batch in batches:
+            while len(in_flight) >= self.concurrency.window:
+                await drain(asyncio.FIRST_COMPLETED)
+            in_flight[asyncio.create_task(self.process_batch(batch))] = batch
+        if in_flight:
+            await drain(asyncio.ALL_COMPLETED)
+
+def export_results(store, pf, triples_path="extract_KG.csv", failed_path="failed_chunks.csv"):
+    latest = store.latest()
+    all_extracted_triples = []
+    failed_chunks = []
+    for _, row in pf.iterrows():
+        entry = latest.get((row['chunk_id'], row['content_hash']))
+        if entry is None:
+            continue
+        status, triples, error, response = entry
+        if status == 'ok':
+            all_extracted_triples.extend(json.loads(triples))
+        else:
+            failed_chunks.append({'chunk_id': row['chunk_id'], 'error': error, 'response': response or ''})
 
-    # Save results
     if all_extracted_triples:
-        pd.DataFrame(all_extracted_triples).to_csv("extract_KG.csv", index=False)
-        print(f"\nDone. Total triples extracted: {len(all_extracted_triples)}. Saved to extract_KG.csv")
+        pd.DataFrame(all_extracted_triples).to_csv(triples_path, index=False)
+        print(f"\nDone. Total triples extracted: {len(all_extracted_triples)}. Saved to {triples_path}")
     else:
         print("\nDone. No valid triples extracted from any chunk.")
 
     if failed_chunks:
-        pd.DataFrame(failed_chunks).to_csv("failed_chunks.csv", index=False)
-        print(f"{len(failed_chunks)} failed chunks saved to failed_chunks.csv.")
+        pd.DataFrame(failed_chunks).to_csv(failed_path, index=False)
+        print(f"{len(failed_chunks)} failed chunks saved to {failed_path}.")
+    elif os.path.exists(failed_path):
+        os.remove(failed_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract S-P-O triples from chunked statutes.")
+    parser.add_argument("--chunks", default="all_chunks.csv", help="Chunk CSV produced by process_pdf.py.")
+    parser.add_argument("--store", default="extraction_store.sqlite",
+                        help="Result store; chunks already extracted with the current prompt are skipped.")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Only re-run the chunks listed in failed_chunks.csv.")
+    parser.add_argument("--scheduler", choices=["async", "threads"], default="async",
+                        help="'async' uses the rate-limit-aware scheduler, 'threads' the fixed thread pool.")
+    parser.add_argument("--workers", type=int, default=10, help="Thread count for --scheduler threads.")
+    parser.add_argument("--rpm", type=int, default=1000, help="Requests-per-minute budget.")
+    parser.add_argument("--tpm", type=int, default=200_000, help="Tokens-per-minute budget.")
+    parser.add_argument("--initial-concurrency", type=int, default=8)
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=200,
+                        help="Completion token budget per chunk; batched requests get this times the batch size.")
+    parser.add_argument("--batch-tokens", type=int, default=0,
+                        help="Pack chunks into one request up to this many prompt tokens (async scheduler only, 0 = off).")
+    parser.add_argument("--batch-max-chunks", type=int, default=16, help="Upper bound on chunks per batched request.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    llm = CachedChatModel(AzureChatOpenAI(
+            azure_deployment="gpt-4o-mini",  
+            api_version="2024-12-01-preview",
+            temperature=0,
+            max_tokens=args.max_tokens,
+            timeout=30,
+            # The async scheduler owns retries and backoff.
+            max_retries=0 if args.scheduler == "async" else 2,
+        ))
+    MAX_WORKERS = args.workers
+    pf = pd.read_csv(args.chunks)
+    pf['content_hash'] = pf.apply(chunk_content_hash, axis=1)
+    store = ExtractionStore(args.store)
+
+    todo = pf
+    if args.retry_failed:
+        failed_ids = set(pd.read_csv("failed_chunks.csv")['chunk_id']) if os.path.exists("failed_chunks.csv") else set()
+        todo = todo[todo['chunk_id'].isin(failed_ids)]
+    completed = store.completed_keys()
+    todo = todo[[(cid, h) not in completed for cid, h in zip(todo['chunk_id'], todo['content_hash'])]]
+    print(f"{len(pf) - len(todo)} of {len(pf)} chunks skipped, {len(todo)} to extract (prompt version {PROMPT_VERSION}).")
+
+    if args.scheduler == "async":
+        scheduler = ExtractionScheduler(
+            llm, rpm=args.rpm, tpm=args.tpm, initial_concurrency=args.initial_concurrency,
+            max_concurrency=args.max_concurrency, max_attempts=args.max_attempts,
+            max_tokens=args.max_tokens, batch_tokens=args.batch_tokens, batch_max_chunks=args.batch_max_chunks,
+        )
+        start = time.perf_counter()
+        with tqdm(total=len(todo), desc="Extracting Triplets") as progress:
+            def on_result(row, result):
+                store.record(row['chunk_id'], row['content_hash'], result)
+                progress.update(1)
+                progress.set_postfix(window=scheduler.concurrency.window, throttled=scheduler.stats['throttled'])
+            asyncio.run(scheduler.run((row for _, row in todo.iterrows()), on_result))
+        print(f"Scheduler stats: {scheduler.stats}")
+        print(f"Throughput: {throughput_report(scheduler.stats, time.perf_counter() - start)}")
+    else:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            future_to_row = {
+                executor.submit(process_chunk, row): row
+                for _, row in todo.iterrows()
+            }
+
+            for future in tqdm(as_completed(future_to_row), total=len(future_to_row), desc="Extracting Triplets"):
+                row = future_to_row[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'triples': [], 'failed': {'chunk_id': row['chunk_id'], 'error': str(e), 'response': ''}}
+                store.record(row['chunk_id'], row['content_hash'], result)
+
+    # Save results
+    export_results(store, pf)
+    store.close()
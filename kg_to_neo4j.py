@@ -1,15 +1,97 @@
 import os
+import sys
+import numpy as np
 import pandas as pd
 import re
+import csv
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
 from tqdm import tqdm
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "app"))
+from RAG.local_graph import LocalGraph, READ_OPTIONS, TRIPLE_COLUMNS, normalize_triple_columns
+from RAG.embeddings import create_embeddings
+
+BULK_INSERT_QUERY = """
+UNWIND $rows AS row
+MERGE (s:Entity {name: row.subject})
+MERGE (o:Entity {name: row.object})
+MERGE (s)-[r:RELATION {type: row.predicate}]->(o)
+ON CREATE SET r.source_chunk = row.source_chunk
+"""
+
+SCHEMA_QUERIES = [
+    # The uniqueness constraint is backed by a range index on :Entity(name),
+    # which is what every MERGE on an entity looks up.
+    "CREATE CONSTRAINT entity_name_unique IF NOT EXISTS FOR (e:Entity) REQUIRE e.name IS UNIQUE",
+    "CREATE INDEX relation_type IF NOT EXISTS FOR ()-[r:RELATION]-() ON (r.type)",
+]
 def load_triples_from_csv(csv_path):
     print(f"Loading triples from: {csv_path}")
-    df = pd.read_csv(csv_path)
+    df = pd.read_csv(csv_path, **READ_OPTIONS)
     print(f"Loaded {len(df)} triples.")
     return df
 
 def normalize_and_deduplicate_triples(triples_df):
+    print(f"Starting normalization and de-duplication of {len(triples_df)} triples...")
+    normalized_df, empty_removed_count = normalize_triple_columns(triples_df)
+    duplicated = normalized_df.duplicated(subset=TRIPLE_COLUMNS, keep='first')
+    duplicates_removed_count = int(duplicated.sum())
+    normalized_df = normalized_df[~duplicated].reset_index(drop=True)
+
+    print(f"Normalization done. {len(normalized_df)} unique triples, {duplicates_removed_count} duplicates removed, {empty_removed_count} empty/invalid removed.")
+    return normalized_df
+
+class HashRuns:
+    # Seen 64-bit triple hashes (8 bytes each) as a few sorted runs whose
+    # sizes at least double, merged like a binary counter. Adding a chunk
+    # merges O(log n) runs amortized instead of re-sorting every hash seen
+    # so far, and a lookup is one binary search per run.
+    def __init__(self):
+        self.runs = []
+
+    def contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            found |= run[positions] == hashes
+        return found
+
+    def add(self, hashes):
+        run = np.unique(hashes)
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = np.union1d(self.runs.pop(), run)
+        if len(run):
+            self.runs.append(run)
+
+def normalize_and_deduplicate_triples_streaming(csv_path, chunksize=100_000):
+    # Reads the CSV in pieces and yields normalized, globally de-duplicated
+    # frames. Seen triples are kept as 64-bit hashes in HashRuns instead of
+    # a set of string tuples.
+    print(f"Streaming normalization and de-duplication of {csv_path} in chunks of {chunksize} rows...")
+    seen_hashes = HashRuns()
+    unique_count = 0
+    empty_removed_count = 0
+    duplicates_removed_count = 0
+
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, **READ_OPTIONS):
+        normalized_df, empty_removed = normalize_triple_columns(chunk)
+        empty_removed_count += empty_removed
+
+        hashes = pd.util.hash_pandas_object(normalized_df[TRIPLE_COLUMNS], index=False).to_numpy()
+        is_new = ~pd.Series(hashes).duplicated(keep='first').to_numpy() & ~seen_hashes.contains(hashes)
+
+        duplicates_removed_count += int((~is_new).sum())
+        unique_count += int(is_new.sum())
+        seen_hashes.add(hashes[is_new])
+        yield normalized_df[is_new].reset_index(drop=True)
+
+    print(f"Normalization done. {unique_count} unique triples, {duplicates_removed_count} duplicates removed, {empty_removed_count} empty/invalid removed.")
+
+def normalize_and_deduplicate_triples_rowwise(triples_df):
+    # Original row-by-row implementation, kept as the reference for benchmarks/normalize_triples.py.
     print(f"Starting normalization and de-duplication of {len(triples_df)} triples...")
     normalized_triples = []
     seen_triples = set()
@@ -75,19 +157,264 @@ def insert_triples_to_neo4j(df, uri, user, password):
     driver.close()
     print("All triples imported to Neo4j!")
 
+def create_schema(driver):
+    print("Creating constraints and indexes on :Entity(name) ...")
+    with driver.session() as session:
+        for query in SCHEMA_QUERIES:
+            session.run(query).consume()
+
+def dataframe_to_rows(df):
+    return df[['subject', 'predicate', 'object', 'source_chunk']].to_dict('records')
+
+def chunk_rows(rows, batch_size):
+    return [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+
+def plan_disjoint_batches(rows, batch_size, workers):
+    # Group rows into waves of up to `workers` batches whose entity sets are
+    # pairwise disjoint, so batches of one wave never wait on each other's
+    # MERGE locks. Rows that would join two batches go to a later wave.
+    waves = []
+    pending = rows
+    while pending:
+        batches = [[] for _ in range(workers)]
+        owner = {}
+        deferred = []
+        for row in pending:
+            owners = {owner.get(row['subject']), owner.get(row['object'])} - {None}
+            if len(owners) > 1:
+                deferred.append(row)
+                continue
+            idx = owners.pop() if owners else min(range(workers), key=lambda i: len(batches[i]))
+            if len(batches[idx]) >= batch_size:
+                deferred.append(row)
+                continue
+            batches[idx].append(row)
+            owner[row['subject']] = idx
+            owner[row['object']] = idx
+        waves.append([batch for batch in batches if batch])
+        pending = deferred
+    return waves
+
+def insert_batch(driver, batch):
+    with driver.session() as session:
+        session.execute_write(lambda tx: tx.run(BULK_INSERT_QUERY, rows=batch).consume())
+    return len(batch)
+
+def iter_frames(triples):
+    # Loaders accept either one DataFrame or an iterable of DataFrames
+    # (as produced by normalize_and_deduplicate_triples_streaming).
+    if isinstance(triples, pd.DataFrame):
+        return [triples]
+    return triples
+
+def bulk_insert_triples_to_neo4j(df, uri, user, password, batch_size=1000, workers=1):
+    print(f"Connecting to Neo4j at {uri} ...")
+    driver = GraphDatabase.driver(uri, auth=(user, password))
+    create_schema(driver)
+
+    total_rows = 0
+    total = len(df) if isinstance(df, pd.DataFrame) else None
+    start = time.perf_counter()
+    with tqdm(total=total, desc="Bulk inserting triples to Neo4j") as progress, \
+         ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for frame in iter_frames(df):
+            rows = dataframe_to_rows(frame)
+            total_rows += len(rows)
+            if workers <= 1:
+                for batch in chunk_rows(rows, batch_size):
+                    progress.update(insert_batch(driver, batch))
+            else:
+                waves = plan_disjoint_batches(rows, batch_size, workers)
+                print(f"Planned {sum(len(w) for w in waves)} batches in {len(waves)} entity-disjoint waves.")
+                for wave in waves:
+                    for inserted in executor.map(lambda batch: insert_batch(driver, batch), wave):
+                        progress.update(inserted)
+    elapsed = time.perf_counter() - start
+
+    driver.close()
+    rate = total_rows / elapsed if elapsed > 0 else float('inf')
+    print(f"All {total_rows} triples imported to Neo4j in {elapsed:.1f}s ({rate:.0f} rows/sec).")
+
+ENTITY_HEADER = [':ID(Entity)', 'name', ':LABEL']
+RELATION_HEADER = [':START_ID(Entity)', ':END_ID(Entity)', 'type', 'source_chunk', ':TYPE']
+
+def write_csv_row(path, row):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerow(row)
+
+def export_admin_import_csvs(df, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        'entities_header': os.path.join(out_dir, 'entities_header.csv'),
+        'entities': os.path.join(out_dir, 'entities.csv'),
+        'relations_header': os.path.join(out_dir, 'relations_header.csv'),
+        'relations': os.path.join(out_dir, 'relations.csv'),
+    }
+    write_csv_row(paths['entities_header'], ENTITY_HEADER)
+    write_csv_row(paths['relations_header'], RELATION_HEADER)
+
+    print(f"Exporting triples to neo4j-admin import files in {out_dir} ...")
+    entity_ids = {}
+    relationship_count = 0
+    with open(paths['entities'], 'w', newline='', encoding='utf-8') as entities_file, \
+         open(paths['relations'], 'w', newline='', encoding='utf-8') as relations_file:
+        entities_writer = csv.writer(entities_file)
+        relations_writer = csv.writer(relations_file)
+
+        def entity_id(name):
+            node_id = entity_ids.get(name)
+            if node_id is None:
+                node_id = entity_ids[name] = len(entity_ids)
+                entities_writer.writerow([node_id, name, 'Entity'])
+            return node_id
+
+        for frame in iter_frames(df):
+            for row in frame[['subject', 'predicate', 'object', 'source_chunk']].itertuples(index=False):
+                relations_writer.writerow([
+                    entity_id(row.subject), entity_id(row.object), row.predicate, row.source_chunk, 'RELATION'
+                ])
+            relationship_count += len(frame)
+
+    print(f"Export done. {len(entity_ids)} entities, {relationship_count} relationships.")
+    return paths
+
+def admin_import_command(paths, database="neo4j"):
+    return (
+        f"neo4j-admin database import full {database} --overwrite-destination --multiline-fields=true "
+        f"--nodes=Entity={paths['entities_header']},{paths['entities']} "
+        f"--relationships=RELATION={paths['relations_header']},{paths['relations']}"
+    )
+
+def load_admin_import_graph(paths):
+    # In-process model of what neo4j-admin builds from the files: IDs are
+    # resolved within the Entity ID space, duplicates and dangling ends fail.
+    def read_with_header(header_path, data_path):
+        with open(header_path, newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f))
+        with open(data_path, newline='', encoding='utf-8') as f:
+            for values in csv.reader(f):
+                yield dict(zip(header, values))
+
+    nodes = {}
+    for record in read_with_header(paths['entities_header'], paths['entities']):
+        node_id = record[':ID(Entity)']
+        if node_id in nodes:
+            raise ValueError(f"Duplicate node id {node_id}")
+        nodes[node_id] = {'labels': {record[':LABEL']}, 'name': record['name']}
+
+    relationships = []
+    for record in read_with_header(paths['relations_header'], paths['relations']):
+        start, end = record[':START_ID(Entity)'], record[':END_ID(Entity)']
+        if start not in nodes or end not in nodes:
+            raise ValueError(f"Relationship references unknown node: {start} -> {end}")
+        relationships.append({
+            'start': start,
+            'end': end,
+            'rel_type': record[':TYPE'],
+            'type': record['type'],
+            'source_chunk': record['source_chunk'],
+        })
+    return nodes, relationships
+
+def verify_admin_import_export(df, paths):
+    nodes, relationships = load_admin_import_graph(paths)
+    names = [node['name'] for node in nodes.values()]
+    if len(set(names)) != len(names):
+        raise ValueError("Entity names are not unique in the export.")
+
+    exported = {
+        (nodes[r['start']]['name'], r['type'], nodes[r['end']]['name'], r['source_chunk'])
+        for r in relationships
+    }
+    expected = {
+        (row.subject, row.predicate, row.object, str(row.source_chunk))
+        for row in df[['subject', 'predicate', 'object', 'source_chunk']].itertuples(index=False)
+    }
+    expected_names = set(df['subject']) | set(df['object'])
+    if len(relationships) != len(df) or exported != expected or set(names) != expected_names:
+        raise ValueError(
+            f"Round trip mismatch: {len(relationships)} relationships / {len(nodes)} nodes exported, "
+            f"{len(df)} triples / {len(expected_names)} entities expected."
+        )
+    print(f"Round trip OK: {len(nodes)} nodes and {len(relationships)} relationships match the triples.")
+
+def write_entity_embeddings(graph, out_dir, batch_size=512):
+    # Embeds every entity name once so the API's entity index can match
+    # keywords semantically; loaded from <snapshot>/entity_embeddings.npz.
+    embeddings = create_embeddings()
+    names = [graph.entities[i] for i in range(len(graph.entities))]
+    vectors = []
+    for start in tqdm(range(0, len(names), batch_size), desc="Embedding entity names"):
+        vectors.extend(embeddings.embed_documents(names[start:start + batch_size]))
+    path = os.path.join(out_dir, "entity_embeddings.npz")
+    np.savez(path, names=np.array(names), vectors=np.array(vectors, dtype=np.float32))
+    print(f"Entity embeddings written to {path}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load extracted triples into Neo4j.")
+    parser.add_argument("--csv", default="extract_KG.csv", help="Path to the triples CSV.")
+    parser.add_argument("--mode", choices=["row", "bulk", "export", "snapshot"], default="bulk",
+                        help="'row' runs one transaction per triple, 'bulk' sends UNWIND batches, "
+                             "'export' writes neo4j-admin import CSVs instead of connecting, "
+                             "'snapshot' writes a LocalGraph snapshot for KG_BACKEND=local.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Triples per UNWIND transaction.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parallel writers; >1 schedules batches over disjoint entity sets.")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the CSV in chunks of this many rows instead of loading it whole.")
+    parser.add_argument("--out-dir", default=None,
+                        help="Output directory for --mode export (default neo4j_import) or snapshot (default kg_snapshot).")
+    parser.add_argument("--entity-embeddings", action="store_true",
+                        help="With --mode snapshot, also embed all entity names for semantic entity resolution.")
+    parser.add_argument("--verify", action="store_true",
+                        help="After --mode export, read the files back and check them against the triples.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     # --- SET FILE PATHS AND NEO4J CREDS ---
-    TRIPLE_CSV_PATH = "extract_KG.csv"
+    TRIPLE_CSV_PATH = args.csv
     NEO4J_URI = os.getenv("NEO4J_URI")
     NEO4J_USER = os.getenv("NEO4J_USERNAME")
     NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
     # --- LOAD, NORMALIZE, DEDUPLICATE ---
-    triples_df = load_triples_from_csv(TRIPLE_CSV_PATH)
-    normalized_df = normalize_and_deduplicate_triples(triples_df)
+    if args.chunksize:
+        normalized_df = normalize_and_deduplicate_triples_streaming(TRIPLE_CSV_PATH, chunksize=args.chunksize)
+    else:
+        triples_df = load_triples_from_csv(TRIPLE_CSV_PATH)
+        normalized_df = normalize_and_deduplicate_triples(triples_df)
+
+    if args.mode == "snapshot":
+        if args.chunksize:
+            normalized_df = pd.concat(normalized_df, ignore_index=True)
+        out_dir = args.out_dir or "kg_snapshot"
+        graph = LocalGraph.from_triples(normalized_df)
+        graph.save(out_dir)
+        print(f"Snapshot written to {out_dir}: {graph.stats()}")
+        if args.entity_embeddings:
+            write_entity_embeddings(graph, out_dir)
+        return
+
+    if args.mode == "export":
+        paths = export_admin_import_csvs(normalized_df, args.out_dir or "neo4j_import")
+        if args.verify:
+            if args.chunksize:
+                normalized_df = pd.concat(
+                    normalize_and_deduplicate_triples_streaming(TRIPLE_CSV_PATH, chunksize=args.chunksize),
+                    ignore_index=True,
+                )
+            verify_admin_import_export(normalized_df, paths)
+        print(f"Import with:\n  {admin_import_command(paths)}")
+        return
 
     # --- UPLOAD TO NEO4J ---
-    insert_triples_to_neo4j(normalized_df, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    if args.mode == "bulk":
+        bulk_insert_triples_to_neo4j(normalized_df, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD,
+                                     batch_size=args.batch_size, workers=args.workers)
+    else:
+        for frame in iter_frames(normalized_df):
+            insert_triples_to_neo4j(frame, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
 
 if __name__ == "__main__":
     main()
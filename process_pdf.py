@@ -1,28 +1,79 @@
 import glob
 import uuid
+import logging
+import hashlib
+import argparse
+import functools
 import pandas as pd
-import tiktoken
 import fitz  # PyMuPDF
 import re
 import os
+import sys
 from langchain_openai import AzureChatOpenAI
 from typing import List
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from tqdm import tqdm 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-def extract_clean_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        raw_text = page.get_text()
-        raw_text = re.sub(r"^\s*strana \d+", "", raw_text, flags=re.MULTILINE)  # Remove page numbers
-        raw_text = re.sub(r"^\d+\s+Z\u00c1KON.*", "", raw_text, flags=re.MULTILINE)  # Remove law number headers
-        text += raw_text + "\n"
-    cleaned_text = re.sub(r"\n{2,}", "\n", text)
-    cleaned_text = re.sub(r" +", " ", cleaned_text)
-    cleaned_text = cleaned_text.strip()
-    return cleaned_text
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "app"))
+from RAG.llm_cache import CachedChatModel
+from RAG.tokens import get_encoder, count_tokens, token_prefix, split_tokens
+
+logger = logging.getLogger(__name__)
+
+# Per-page removal rules for e-Sbírka "IZ" PDFs. Other gazette layouts can
+# pass their own list to PageCleaner.
+E_SBIRKA_PAGE_RULES = [
+    r"^\s*strana \d+",        # Remove page numbers
+    r"^\d+\s+Z\u00c1KON.*",    # Remove law number headers
+]
+MULTI_NEWLINE_RE = re.compile(r"\n{2,}")
+MULTI_SPACE_RE = re.compile(r" {2,}")
+
+class PageCleaner:
+    # Compiles the page rules once into a single alternation applied in one
+    # pass per page. The rules never overlap, so the result is identical to
+    # applying them one after another. With layout=True, text blocks inside
+    # the top/bottom margins (running headers, footers, page numbers) are
+    # dropped by position before the rules run.
+    def __init__(self, page_rules=E_SBIRKA_PAGE_RULES, layout=False, top_margin=60.0, bottom_margin=40.0):
+        self.page_re = re.compile("|".join(f"(?:{rule})" for rule in page_rules), re.MULTILINE) if page_rules else None
+        self.layout = layout
+        self.top_margin = top_margin
+        self.bottom_margin = bottom_margin
+
+    def page_text(self, page):
+        if not self.layout:
+            return page.get_text()
+        height = page.rect.height
+        blocks = page.get_text("blocks")
+        return "".join(
+            block[4] if block[4].endswith("\n") else block[4] + "\n"
+            for block in blocks
+            if block[6] == 0 and block[3] > self.top_margin and block[1] < height - self.bottom_margin
+        )
+
+    def clean_page(self, raw_text):
+        return self.page_re.sub("", raw_text) if self.page_re is not None else raw_text
+
+    def clean_document(self, page_texts):
+        parts = []
+        for raw_text in page_texts:
+            parts.append(self.clean_page(raw_text))
+            parts.append("\n")
+        cleaned_text = MULTI_NEWLINE_RE.sub("\n", "".join(parts))
+        cleaned_text = MULTI_SPACE_RE.sub(" ", cleaned_text)
+        return cleaned_text.strip()
+
+    def extract(self, pdf_path):
+        with fitz.open(pdf_path) as doc:
+            return self.clean_document(self.page_text(page) for page in doc)
+
+DEFAULT_CLEANER = PageCleaner()
+
+def extract_clean_text_from_pdf(pdf_path, cleaner=None):
+    return (cleaner or DEFAULT_CLEANER).extract(pdf_path)
 
 def get_header(
     text: str,
@@ -31,28 +82,71 @@ def get_header(
 ) -> str:
     if not isinstance(text, str) or not text.strip():
         raise ValueError("Input must be a non-empty string.")
-    enc = tiktoken.get_encoding("o200k_base")
-    ids = enc.encode(text)
-    if not ids:
+    chunk = token_prefix(text, chunk_tokens, whitespace=False)
+    if not chunk:
         raise ValueError("Cannot encode text.")
-    chunk_ids = ids[:chunk_tokens]
-    chunk = enc.decode(chunk_ids)
     prompt = f"{summarizer_instructions}:\n\n{chunk}"
     try:
-        llm = AzureChatOpenAI(
+        llm = CachedChatModel(AzureChatOpenAI(
             azure_deployment="gpt-4o-mini",  
             api_version="2024-12-01-preview",
             temperature=0,
             max_tokens=200,
             timeout=30,
             max_retries=2,
-        )
+        ))
         summary = llm.invoke(prompt).content.strip()
     except Exception as e:
         print(f"LLM summary failed: {e}")
         summary = ""
     return summary
 
+# Titles of the statutes in e-Sbírka, keyed by (year, number) from the
+# collection citation "č. <number>/<year> Sb.".
+STATUTE_NAMES = {
+    (1991, 455): "o živnostenském podnikání (živnostenský zákon)",
+    (1992, 586): "o daních z příjmů",
+    (2000, 128): "o obcích (obecní zřízení)",
+    (2000, 361): "o provozu na pozemních komunikacích a o změnách některých zákonů (zákon o silničním provozu)",
+    (2006, 183): "o územním plánování a stavebním řádu (stavební zákon)",
+    (2006, 262): "zákoník práce",
+    (2008, 125): "o přeměnách obchodních společností a družstev",
+    (2009, 40): "trestní zákoník",
+    (2012, 90): "o obchodních společnostech a družstvech (zákon o obchodních korporacích)",
+    (2016, 250): "o odpovědnosti za přestupky a řízení o nich",
+    (2021, 283): "stavební zákon",
+}
+E_SBIRKA_FILE_RE = re.compile(r"^Sb_(?P<year>\d{4})_(?P<number>\d+)_(?P<version>\d{4}-\d{2}-\d{2})")
+TITLE_BLOCK_RE = re.compile(
+    r"ze dne (?P<date>\d{1,2}\.\s*\w+\s+(?P<year>\d{4}))\s*\n(?P<title>.+?)\n[^\n]*?\bse\s+usnesl",
+    re.DOTALL,
+)
+
+def detect_header(text: str, file_name: str = "", title_chars: int = 2000) -> str:
+    # Builds the statute citation from the e-Sbírka file name and the
+    # first-page title block; asks the LLM only when neither is usable.
+    year = number = title = date = None
+    match = E_SBIRKA_FILE_RE.match(os.path.basename(file_name))
+    if match:
+        year, number = int(match.group("year")), int(match.group("number"))
+        title = STATUTE_NAMES.get((year, number))
+        if title is None:
+            logger.debug("detect_header: %d/%d Sb. not in STATUTE_NAMES (%s)", number, year, file_name)
+
+    if title is None:
+        match = TITLE_BLOCK_RE.search(text[:title_chars])
+        if match:
+            title = re.sub(r"\s+", " ", match.group("title")).strip()
+            year = year or int(match.group("year"))
+            date = match.group("date")
+
+    if title and number:
+        return f"Zákon č. {number}/{year} Sb., {title}"
+    if title:
+        return f"Zákon ze dne {date} {title}" if date else f"Zákon {title}"
+    logger.debug("detect_header: no known title or title block in %s, asking the LLM", file_name or "document")
+    return get_header(text)
+
 def split_document(raw_texts, file_name="", header=""):
     documents = [Document(page_content=raw_texts)]
     text_splitter = RecursiveCharacterTextSplitter(
@@ -68,6 +162,157 @@ def split_document(raw_texts, file_name="", header=""):
         doc.metadata['chunk_id'] = uuid.uuid4().hex
     return chunk_docs
 
+SECTION_RE = re.compile(r"^§\s*\d+[a-z]*$")
+ODSTAVEC_RE = re.compile(r"^\(\d+[a-z]*\)")
+PISMENO_RE = re.compile(r"^[a-z]{1,2}\)")
+HEADING_RE = re.compile(r"^(ČÁST|HLAVA|Díl|Oddíl)\b")
+
+def parse_statute_units(text):
+    # Splits cleaned statute text into leaf units tagged with their
+    # (§, odstavec, písmeno) path. Part/title headings are carried over to
+    # the § that follows them; headings with no § after them (and the text
+    # under them) become a unit of their own, keyed by the first heading.
+    units = []
+    section = odstavec = None
+    path = ("preamble",)
+    lines = []
+    pending_headings = []
+
+    def flush():
+        if lines:
+            units.append({"path": path, "text": "\n".join(lines)})
+            lines.clear()
+
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if SECTION_RE.match(stripped):
+            flush()
+            section, odstavec = re.sub(r"\s+", " ", stripped), None
+            path = (section,)
+            lines.extend(pending_headings)
+            pending_headings.clear()
+        elif HEADING_RE.match(stripped) and section is not None:
+            flush()
+            pending_headings.append(line)
+            continue
+        elif pending_headings:
+            pending_headings.append(line)
+            continue
+        elif section is not None and ODSTAVEC_RE.match(stripped):
+            flush()
+            odstavec = ODSTAVEC_RE.match(stripped).group(0)
+            path = (section, odstavec)
+        elif section is not None and PISMENO_RE.match(stripped):
+            flush()
+            path = (section, odstavec, PISMENO_RE.match(stripped).group(0)) if odstavec else (section, PISMENO_RE.match(stripped).group(0))
+        lines.append(line)
+    flush()
+    if pending_headings:
+        path = (re.sub(r"\s+", " ", pending_headings[0].strip()),)
+        lines.extend(pending_headings)
+        flush()
+    return units
+
+class StatuteChunker:
+    # Packs statute units into chunks of at most max_tokens o200k_base
+    # tokens, keeping whole §, then whole odstavce, then whole písmena
+    # together where they fit. Chunks do not overlap. Chunk ids hash the
+    # document name and § path, so they are stable across re-ingestion.
+    def __init__(self, max_tokens=512, encoder=None):
+        self.max_tokens = max_tokens
+        self.encoder = encoder
+
+    def split(self, text, doc_id):
+        enc = self.encoder or get_encoder()
+        units = parse_statute_units(text)
+        # Tokens can merge across the "\n" between units, so next to each
+        # unit's count we need the count of each neighbouring pair joined.
+        # Both come from one batch encode; joins[i] is what the join of units
+        # i and i + 1 adds on top of their own counts.
+        texts = [unit["text"] for unit in units]
+        pairs = [f"{a}\n{b}" for a, b in zip(texts, texts[1:])]
+        encoded = enc.encode_ordinary_batch(texts + pairs)
+        counts = [len(tokens) for tokens in encoded[:len(texts)]]
+        joins = [len(tokens) - counts[i] - counts[i + 1] for i, tokens in enumerate(encoded[len(texts):])]
+        for i, unit in enumerate(units):
+            unit["index"] = i
+
+        chunks = []
+        current = []
+        current_size = 0
+
+        def flush():
+            nonlocal current, current_size
+            if current:
+                chunks.append({"units": current, "part": None})
+            current = []
+            current_size = 0
+
+        def size(group):
+            # Units of a group are consecutive in the document.
+            return sum(counts[u["index"]] for u in group) + sum(joins[u["index"]] for u in group[:-1])
+
+        def pack(group_units, depth):
+            groups = []
+            for unit in group_units:
+                key = unit["path"][:depth + 1]
+                if groups and groups[-1][0] == key:
+                    groups[-1][1].append(unit)
+                else:
+                    groups.append((key, [unit]))
+            nonlocal current_size
+            for _, group in groups:
+                n = size(group)
+                if current and current_size + joins[current[-1]["index"]] + n <= self.max_tokens:
+                    current_size += joins[current[-1]["index"]] + n
+                    current.extend(group)
+                elif n <= self.max_tokens:
+                    flush()
+                    current.extend(group)
+                    current_size = n
+                elif len(group) > 1 and depth < 2:
+                    flush()
+                    pack(group, depth + 1)
+                else:
+                    flush()
+                    for unit in group:
+                        # Cut on whitespace / character boundaries so no
+                        # diacritic is split into U+FFFD at a chunk edge.
+                        for part, piece in enumerate(split_tokens(unit["text"], self.max_tokens, enc)):
+                            chunks.append({"units": [dict(unit, text=piece)], "part": part})
+
+        pack(units, 0)
+        flush()
+
+        documents = []
+        seen_ids = set()
+        for chunk in chunks:
+            first, last = chunk["units"][0]["path"], chunk["units"][-1]["path"]
+            path = " ".join(p for p in first if p)
+            if last != first:
+                path += " – " + " ".join(p for p in last if p)
+            if chunk["part"] is not None:
+                path += f" #{chunk['part']}"
+            key = f"{doc_id}|{path}"
+            occurrence = 0
+            while key in seen_ids:
+                occurrence += 1
+                key = f"{doc_id}|{path}|{occurrence}"
+            seen_ids.add(key)
+            documents.append(Document(
+                page_content="\n".join(u["text"] for u in chunk["units"]),
+                metadata={"path": path, "chunk_id": hashlib.sha1(key.encode("utf-8")).hexdigest()[:32]},
+            ))
+        return documents
+
+def split_document_structured(raw_texts, file_name="", header="", max_tokens=512):
+    doc_id = os.path.splitext(file_name)[0]
+    chunk_docs = StatuteChunker(max_tokens=max_tokens).split(raw_texts, doc_id)
+    for doc in chunk_docs:
+        doc.metadata['name'] = file_name
+        doc.metadata['header'] = header
+    return chunk_docs
+
 def convert_chunks_to_df(chunks, header=""):
     rows = []
     for chunk in chunks:
@@ -79,23 +324,117 @@ def convert_chunks_to_df(chunks, header=""):
     df = pd.DataFrame(rows)
     return df
 
+def append_chunks(df, output_path, first):
+    # Appends one document's chunks so nothing accumulates across documents.
+    if output_path.endswith(".jsonl"):
+        with open(output_path, "w" if first else "a", encoding="utf-8") as f:
+            df.to_json(f, orient="records", lines=True, force_ascii=False)
+    else:
+        df.to_csv(output_path, mode="w" if first else "a", header=first, index=False)
+
+def run_pipeline(pdf_paths, output_path="all_chunks.csv", workers=None, header_workers=8, max_inflight=None,
+                 cleaner=None, splitter=None):
+    splitter = splitter or split_document_structured
+    # Page extraction runs on a process pool, header detection (and its LLM
+    # fallback) overlaps on a thread pool, and each document's chunks are
+    # written as soon as they are ready. At most max_inflight documents are
+    # held in memory at once.
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or 2 * workers
+    paths = iter(pdf_paths)
+    pending = {}
+    written_docs = 0
+    written_chunks = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as extract_pool, \
+         ThreadPoolExecutor(max_workers=header_workers) as header_pool, \
+         tqdm(total=len(pdf_paths), desc="Processing PDFs") as progress:
+
+        def submit_next():
+            pdf_path = next(paths, None)
+            if pdf_path is not None:
+                pending[extract_pool.submit(extract_clean_text_from_pdf, pdf_path, cleaner)] = ("extract", pdf_path, None)
+
+        for _ in range(max_inflight):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, pdf_path, clean_text = pending.pop(future)
+                file_name = os.path.basename(pdf_path)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Failed to process {file_name}: {e}")
+                    progress.update(1)
+                    submit_next()
+                    continue
+
+                if stage == "extract":
+                    pending[header_pool.submit(detect_header, result, file_name)] = ("header", pdf_path, result)
+                    continue
+
+                header = result
+                chunks = splitter(clean_text, file_name=file_name, header=header)
+                append_chunks(convert_chunks_to_df(chunks, header), output_path, first=written_docs == 0)
+                written_docs += 1
+                written_chunks += len(chunks)
+                progress.update(1)
+                submit_next()
+
+    print(f"Saved {written_chunks} chunks from {written_docs} documents to {output_path}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean and chunk e-Sbírka PDFs.")
+    parser.add_argument("--input-glob", default="e-sbirka_data/e-sbirka_data/*.pdf")
+    parser.add_argument("--output", default="all_chunks.csv", help="Output .csv or .jsonl file.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Extract in parallel and write chunks incrementally instead of processing PDFs one by one.")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count).")
+    parser.add_argument("--header-workers", type=int, default=8, help="Concurrent header detections (LLM fallback calls).")
+    parser.add_argument("--max-inflight", type=int, default=None,
+                        help="Documents held in memory at once (default: 2x workers).")
+    parser.add_argument("--chunker", choices=["structured", "recursive"], default="structured",
+                        help="'structured' packs whole §/odstavec/písmeno units into a token budget with stable ids; "
+                             "'recursive' is the old 1500-character splitter with random ids.")
+    parser.add_argument("--max-tokens", type=int, default=512, help="Token budget per chunk for --chunker structured.")
+    parser.add_argument("--layout-clean", action="store_true",
+                        help="Drop running headers/footers by block position instead of relying on the regex rules alone.")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Log debug messages, e.g. which documents fall back to LLM header detection.")
+    return parser.parse_args()
+
 def main():
-    dir_paths = glob.glob("e-sbirka_data/e-sbirka_data/*.pdf")
+    args = parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    cleaner = PageCleaner(layout=args.layout_clean)
+    if args.chunker == "structured":
+        splitter = functools.partial(split_document_structured, max_tokens=args.max_tokens)
+    else:
+        splitter = split_document
+    if args.pipeline:
+        run_pipeline(sorted(glob.glob(args.input_glob)), args.output, workers=args.workers,
+                     header_workers=args.header_workers, max_inflight=args.max_inflight, cleaner=cleaner,
+                     splitter=splitter)
+        return
+
+    dir_paths = glob.glob(args.input_glob)
     all_chunks = []
     for pdf_path in tqdm(dir_paths, desc="Processing PDFs"):
         file_name = os.path.basename(pdf_path)
         print(f"Processing: {file_name}")
-        clean_text = extract_clean_text_from_pdf(pdf_path)
-        header = get_header(clean_text)
-        chunks = split_document(clean_text, file_name=file_name, header=header)
+        clean_text = extract_clean_text_from_pdf(pdf_path, cleaner)
+        header = detect_header(clean_text, file_name)
+        chunks = splitter(clean_text, file_name=file_name, header=header)
         all_chunks.extend(chunks)
         print(f"  Added {len(chunks)} chunks.")
     
     final_df = convert_chunks_to_df(all_chunks, header)
-    final_df.to_csv("all_chunks.csv", index=False)
+    append_chunks(final_df, args.output, first=True)
     # Hoặc lưu .parquet nếu muốn:
     # final_df.to_parquet("all_chunks.parquet", index=False)
-    print(f"Đã lưu tất cả chunk vào all_chunks.csv ({len(final_df)} dòng)")
+    print(f"Đã lưu tất cả chunk vào {args.output} ({len(final_df)} dòng)")
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,15 @@
 import os
+import sys
+import argparse
 import pandas as pd
 from langchain_core.documents import Document
-from langchain_openai import AzureOpenAIEmbeddings
 from langchain_qdrant import QdrantVectorStore
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "app"))
+from RAG.local_vector import LocalVectorStore, INDEX_TYPES
+from RAG.embeddings import create_embeddings
+from RAG.lexical_index import LexicalIndex
+
 def build_documents_from_csv(csv_path):
     pf = pd.read_csv(csv_path)
     docs = []
@@ -31,17 +37,49 @@ def build_qdrant_index(docs, embedding_model, url, api_key, collection_name):
     print(f"Qdrant upload complete.")
     return qdrant
 
+def build_local_index(docs, embedding_model, path, index_type="hnsw"):
+    print(f"Embedding {len(docs)} documents into local '{index_type}' index at {path}...")
+    store = LocalVectorStore.from_documents(docs, embedding_model, path, index_type=index_type)
+    print(f"Local index complete: {len(store)} vectors, {store.memory_bytes() / 2**20:.1f} MiB resident index.")
+    return store
+
+def build_lexical_index(docs, path):
+    print(f"Writing BM25 index over {len(docs)} documents to {path}...")
+    index = LexicalIndex.from_documents(docs, path)
+    print(f"Lexical index complete: {index.config['terms']} terms, {index.config['postings']} postings.")
+    return index
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embed chunks and index them for semantic search.")
+    parser.add_argument("--csv", default="all_chunks.csv")
+    parser.add_argument("--backend", choices=["qdrant", "local", "none"], default="qdrant",
+                        help="'qdrant' uploads to Qdrant Cloud, 'local' writes a LocalVectorStore (VECTOR_BACKEND=local), 'none' skips the dense index.")
+    parser.add_argument("--out-dir", default="vector_store", help="Output directory for --backend local.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="hnsw",
+                        help="'flat' exact scan, 'hnsw' graph index, 'ivfpq' compressed index for corpora larger than RAM.")
+    parser.add_argument("--lexical", action="store_true", help="Also write the BM25 index used for hybrid search.")
+    parser.add_argument("--lexical-dir", default="lexical_index", help="Output directory for --lexical.")
+    return parser.parse_args()
+
 def main():
-    CSV_PATH = "all_chunks.csv"
+    args = parse_args()
+    CSV_PATH = args.csv
     QDRANT_URL = "https://20840cd3-a3bf-4a62-af36-72b49fe3bed0.us-east-1-0.aws.cloud.qdrant.io"
     QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")  # Ensure your API key is set in env
-    EMBED_MODEL_DEPLOYMENT = "ace-text-embedding-3-large"
     QDRANT_COLLECTION = "law"
     
     docs = build_documents_from_csv(CSV_PATH)
-    
-    embeddings = AzureOpenAIEmbeddings(model=EMBED_MODEL_DEPLOYMENT)
-    
+    if args.lexical:
+        build_lexical_index(docs, args.lexical_dir)
+    if args.backend == "none":
+        return
+
+    embeddings = create_embeddings()
+
+    if args.backend == "local":
+        build_local_index(docs, embeddings, args.out_dir, index_type=args.index_type)
+        return
+
     build_qdrant_index(
         docs,
         embedding_model=embeddings,
@@ -1,83 +1,155 @@
 import os
-
-# === LangSmith tracing setup ===
-os.environ["LANGCHAIN_TRACING_V2"] = "true"
-os.environ["LANGCHAIN_PROJECT"] = "tax-qa-rag"
 import json
-from pprint import pprint
+import time
+import uuid
+import random
+import asyncio
+import logging
 from dotenv import load_dotenv
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from langchain_openai import AzureChatOpenAI
 from langchain_core.messages import HumanMessage
 from langchain_core.runnables import RunnableConfig
+from langchain_core.tracers.langchain import LangChainTracer
 from langgraph.graph import START, END, StateGraph
+from langgraph.config import get_stream_writer
 
-from RAG.kg_rag import kg_graph, vector_rag
+from RAG.kg_rag import akg_graph, avector_search
+from RAG.context import assemble_context
+from RAG.answer_cache import get_answer_cache
+from RAG.router import get_local_router, parse_route, is_confident, ROUTER_MODE
+from RAG.metrics import metrics
 from RAG.prompt import CoT_reasoning_critique, router_prompt
+from RAG.clients import get_registry, run_sync
+from RAG.json_stream import JsonFieldStreamer
 from json_repair import repair_json
 
 # Load environment variables
 load_dotenv()
 
-# Initialize the LLM globally
-llm = AzureChatOpenAI(
-    azure_deployment="gpt-4o-mini",  
-    api_version="2024-12-01-preview",
-    temperature=0,
-    max_tokens=4096,
-    timeout=30,
-    max_retries=2,
-)
+logger = logging.getLogger(__name__)
+
+# LangSmith tracing is opt-in: this share of requests (0 to 1) is traced to
+# LANGCHAIN_PROJECT with LANGSMITH_API_KEY. Setting LANGCHAIN_TRACING_V2=true
+# instead traces every request.
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", 0))
+TRACING_PROJECT = os.getenv("LANGCHAIN_PROJECT", "tax-qa-rag")
+
+def run_config(thread_id):
+    config = {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}}
+    if TRACING_SAMPLE_RATE > 0 and random.random() < TRACING_SAMPLE_RATE:
+        config["callbacks"] = [LangChainTracer(project_name=TRACING_PROJECT)]
+    return config
 
 @dataclass(kw_only=True)
 class GraphState:
     question: str = field(default=None)      # User input question
     router: Optional[str] = field(default=None)
+    router_source: Optional[str] = field(default=None)
     documents: List = field(default_factory=list)
     answer: Optional[str] = field(default=None)
+    context_stats: Optional[Dict] = field(default=None)
 
-def router_node(state: GraphState):
-    print("=============== GENERATE SMART QUESTION ========================")
+async def router_node(state: GraphState):
+    logger.debug("router_node: start")
     question = state.question
-    response = llm.invoke([HumanMessage(content=router_prompt.replace("<input_replace>", question))])
-    print(response.content)
-    return {"router": response.content}
+    if ROUTER_MODE != "llm":
+        # Most questions are clearly legal or clearly chit-chat; only the
+        # ambiguous rest pays for an LLM round trip.
+        with metrics.stage("router_local"):
+            route, confidence = get_local_router().predict(question)
+        if is_confident(route, confidence) or ROUTER_MODE == "local-only":
+            logger.debug("router_node: local decision=%s (%.3f)", route, confidence)
+            metrics.inc("rag_router_decisions_total", {"source": "local", "route": route})
+            return {"router": route, "router_source": "local"}
+    clients = await get_registry()
+    async with clients.track("llm"), metrics.stage("router") as stage:
+        response = await clients.llm.ainvoke([HumanMessage(content=router_prompt.replace("<input_replace>", question))])
+        stage.usage(response)
+    logger.debug("router_node: decision=%s", response.content)
+    route = parse_route(response.content)
+    metrics.inc("rag_router_decisions_total", {"source": "llm", "route": route})
+    return {"router": route, "router_source": "llm"}
 
 def choose_tool_to_use(state: GraphState):
-    print("=============== CHOOSE TOOL FOR SMART QUESTION ========================")
     return 'none' if state.router == 'none' else 'rag'
 
-def rag_node(state: GraphState):
-    print("=============== Knowledge Graph and Vector Retrieval NODE ========================")
+async def rag_node(state: GraphState):
+    logger.debug("rag_node: start")
     question = state.question
-    documents = [kg_graph(question), vector_rag(question)]
+    # KG and vector retrieval are independent, so run them concurrently.
+    documents = list(await asyncio.gather(akg_graph(question), avector_search(question)))
     return {"documents": documents}
 
 def normal_node(state: GraphState):
-    print("=============== NORMAL NODE ========================")
+    logger.debug("normal_node: start")
     return {"answer": "Your question is not relevant to law. Please provide a question relevant to law."}
 
-def final_node(state: GraphState):
-    print("=============== FINAL ANSWER NODE ========================")
+class AnswerDeltaForwarder:
+    # Turns JsonFieldStreamer events into answer_delta events for the answer
+    # final_node will select: chosen_answer first, replaced (answer_reset) by
+    # deeper_wider_than_chosen_answer once it is clearly not "None".
+    def __init__(self, writer):
+        self.writer = writer
+        self.deeper_buffer = ""
+        self.deeper_live = False
+
+    def handle(self, event):
+        kind, key = event[0], event[1]
+        if key == "chosen_answer":
+            if kind == "delta":
+                self.writer({"event": "answer_delta", "delta": event[2]})
+        elif self.deeper_live:
+            if kind == "delta":
+                self.writer({"event": "answer_delta", "delta": event[2]})
+        elif kind == "delta":
+            self.deeper_buffer += event[2]
+            if not "None".startswith(self.deeper_buffer):
+                self._go_live()
+        elif kind == "end" and self.deeper_buffer and self.deeper_buffer != "None":
+            self._go_live()
+
+    def _go_live(self):
+        self.deeper_live = True
+        self.writer({"event": "answer_reset"})
+        self.writer({"event": "answer_delta", "delta": self.deeper_buffer})
+
+async def final_node(state: GraphState):
+    logger.debug("final_node: start")
     question = state.question
-    docs = state.documents
-    # Đảm bảo prompt có đúng context/question
-    cot_final_prompt = CoT_reasoning_critique.replace("<context_replace>", question).replace("<context_replace>", str(docs))
-    final_result = llm.invoke([HumanMessage(content=cot_final_prompt)])
-    ans_json = json.loads(repair_json(final_result.content))
+    kg_records, chunks = state.documents
+    with metrics.stage("context") as stage:
+        context, context_stats = assemble_context(question, kg_records, chunks)
+        stage.results(context_stats["chunks"])
+    metrics.inc("rag_context_tokens_total", {"kind": "raw"}, context_stats["raw_tokens"])
+    metrics.inc("rag_context_tokens_total", {"kind": "context"}, context_stats["context_tokens"])
+    logger.info("final_node: context %(context_tokens)d tokens, %(saved_tokens)d saved of %(raw_tokens)d", context_stats)
+    cot_final_prompt = CoT_reasoning_critique.replace("<context_replace>", context).replace("<question_replace>", question)
+    clients = await get_registry()
+    # Stream the completion so answer text can be forwarded while it is
+    # generated; writer is a no-op unless the graph runs in "custom" mode.
+    forwarder = AnswerDeltaForwarder(get_stream_writer())
+    streamer = JsonFieldStreamer(["chosen_answer", "deeper_wider_than_chosen_answer"])
+    parts = []
+    async with clients.track("llm"), metrics.stage("final_llm") as stage:
+        async for chunk in clients.llm.astream([HumanMessage(content=cot_final_prompt)]):
+            stage.usage(chunk)
+            parts.append(chunk.content)
+            for event in streamer.feed(chunk.content):
+                forwarder.handle(event)
+    ans_json = json.loads(repair_json("".join(parts)))
 
     if isinstance(ans_json, list):
         ans_json = ans_json[0]
-    pprint(ans_json, indent=2, width=170)
+    logger.debug("final_node: answer json %s", ans_json)
 
     answer = ans_json.get('chosen_answer')
     if ans_json.get('deeper_wider_than_chosen_answer') and ans_json['deeper_wider_than_chosen_answer'] != 'None':
         answer = ans_json['deeper_wider_than_chosen_answer']
-    return {"answer": answer}
+    return {"answer": answer, "context_stats": context_stats}
 
-def create_agent(question):
+def build_agent():
     workflow = StateGraph(GraphState)
     workflow.add_node("router_node", router_node)
     workflow.add_node("rag_node", rag_node)
@@ -90,21 +162,86 @@ def create_agent(question):
         choose_tool_to_use,
         {
             "rag": "rag_node",
-            "no": "normal_answer_node",
+            "none": "normal_answer_node",
         },
     )
     workflow.add_edge("rag_node", "final_node")
     workflow.add_edge("normal_answer_node", END)
     workflow.add_edge("final_node", END)
 
-    app = workflow.compile()
+    return workflow.compile()
+
+# Compiled once at import and shared by every request.
+agent_app = build_agent()
+
+async def cached_answer(question):
+    # Returns (stored answer or None, question embedding or None). Cache
+    # errors never fail the request; the pipeline just runs uncached.
+    cache = get_answer_cache()
+    if cache is None:
+        return None, None
+    try:
+        clients = await get_registry()
+        if cache.version_due():
+            cache.check_version(await clients.index_fingerprint())
+        async with clients.track("llm"), metrics.stage("embedding") as stage:
+            vector = await clients.embeddings.aembed_query(question)
+            stage.results(1)
+    except Exception as e:
+        logger.warning("answer cache unavailable: %s", e)
+        return None, None
+    with metrics.stage("answer_cache"):
+        answer, similarity = cache.lookup(question, vector)
+    if answer is not None:
+        logger.info("answer cache hit (similarity %.3f)", similarity)
+    return answer, vector
+
+def store_answer(question, vector, answer, started):
+    if vector is not None:
+        get_answer_cache().store(question, vector, answer, time.perf_counter() - started)
+
+async def acreate_agent(question, thread_id=None):
+    started = time.perf_counter()
+    answer, vector = await cached_answer(question)
+    if answer is not None:
+        return answer
     inputs = {"question": question}
+    config = run_config(thread_id)
     value = None
-    for output in app.stream(inputs, config={"configurable": {"thread_id": 42}}):
-        for key, value in output.items():
-            pprint(f"Finished running: {key}:", indent=2, width=80, depth=None)
+    with metrics.stage("pipeline"):
+        async for output in agent_app.astream(inputs, config=config):
+            for key, value in output.items():
+                logger.debug("Finished running: %s (thread %s)", key, config["configurable"]["thread_id"])
+    store_answer(question, vector, value['answer'], started)
     return value['answer']
 
+async def astream_agent(question, thread_id=None):
+    started = time.perf_counter()
+    answer, vector = await cached_answer(question)
+    if answer is not None:
+        yield {"event": "node", "node": "answer_cache"}
+        yield {"event": "answer_delta", "delta": answer}
+        yield {"event": "done", "answer": answer}
+        return
+    inputs = {"question": question}
+    config = run_config(thread_id)
+    answer = None
+    with metrics.stage("pipeline"):
+        async for mode, chunk in agent_app.astream(inputs, config=config, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                yield chunk
+                continue
+            for key, value in chunk.items():
+                logger.debug("Finished running: %s (thread %s)", key, config["configurable"]["thread_id"])
+                if value and "answer" in value:
+                    answer = value["answer"]
+                yield {"event": "node", "node": key}
+    store_answer(question, vector, answer, started)
+    yield {"event": "done", "answer": answer}
+
+def create_agent(question, thread_id=None):
+    return run_sync(acreate_agent(question, thread_id=thread_id))
+
 # if __name__ == "__main__":
 #     ans = create_agent("How is the taxpayer's tax calculated?")
-#     pprint(ans)
+#     print(ans)
@@ -0,0 +1,170 @@
+import os
+import re
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "true").lower() in ("1", "true", "yes")
+# Cosine similarity between question embeddings above which a stored answer
+# is returned. Too low a value answers a different question on the same
+# topic; measure on real question pairs with benchmarks.answer_cache.
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 2000))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600)) or None
+# Seconds between checks of the KG / vector index fingerprint.
+ANSWER_CACHE_VERSION_INTERVAL = float(os.getenv("ANSWER_CACHE_VERSION_INTERVAL", 60))
+
+NUMBER_RE = re.compile(r"\d+[a-z]?", re.IGNORECASE)
+LATENCY_WINDOW = 1000
+
+def numbers(question):
+    # "§ 4" and "§ 5" questions embed almost identically; a hit also needs
+    # the same section, year and amount numbers.
+    return frozenset(n.lower() for n in NUMBER_RE.findall(question))
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else None
+
+class SemanticAnswerCache:
+    # Answers of previously asked questions, looked up by embedding
+    # similarity. Entries live in preallocated slots of one normalized
+    # matrix, so a lookup is a single matrix-vector product (exact, and
+    # sub-millisecond at a few thousand entries) and an evicted slot is
+    # simply reused. LRU order and TTL are kept per slot.
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 ttl=ANSWER_CACHE_TTL, version_interval=ANSWER_CACHE_VERSION_INTERVAL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_interval = version_interval
+        self.vectors = None
+        self.valid = np.zeros(max_entries, dtype=bool)
+        self.entries = [None] * max_entries
+        self.lru = OrderedDict()
+        self.free = list(range(max_entries - 1, -1, -1))
+        self.version = None
+        self.version_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.lookup_latencies = deque(maxlen=LATENCY_WINDOW)
+        self.hit_similarities = deque(maxlen=LATENCY_WINDOW)
+        self.miss_latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def __len__(self):
+        return len(self.lru)
+
+    def remove(self, slot):
+        self.valid[slot] = False
+        self.entries[slot] = None
+        self.lru.pop(slot, None)
+        self.free.append(slot)
+
+    def invalidate(self):
+        for slot in list(self.lru):
+            self.remove(slot)
+        self.invalidations += 1
+
+    def check_version(self, version):
+        # Called with the current index fingerprint; a change means the KG or
+        # a retrieval index was rebuilt and every stored answer may be stale.
+        self.version_checked = time.monotonic()
+        if version is None:
+            return
+        if self.version is not None and version != self.version:
+            self.invalidate()
+        self.version = version
+
+    def version_due(self):
+        return time.monotonic() - self.version_checked >= self.version_interval
+
+    def lookup(self, question, vector):
+        # Returns (answer, similarity) for the closest fresh entry above the
+        # threshold, or (None, best similarity).
+        start = time.perf_counter()
+        answer, best = None, None
+        if self.lru:
+            query = np.asarray(vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            scores = self.vectors @ query
+            scores[~self.valid] = -1.0
+            now = time.time()
+            key = numbers(question)
+            top = np.argpartition(-scores, min(8, len(scores) - 1))[:8]
+            for slot in top[np.argsort(-scores[top])]:
+                score = float(scores[slot])
+                if score < self.threshold:
+                    break
+                entry = self.entries[slot]
+                if self.ttl is not None and entry["created_at"] + self.ttl < now:
+                    self.remove(slot)
+                    self.expirations += 1
+                    continue
+                if entry["numbers"] != key:
+                    continue
+                answer, best = entry["answer"], score
+                self.lru.move_to_end(slot)
+                break
+            if best is None:
+                best = float(scores.max()) if len(self.lru) else None
+        if answer is not None:
+            self.hits += 1
+            self.hit_similarities.append(best)
+        else:
+            self.misses += 1
+        self.lookup_latencies.append(time.perf_counter() - start)
+        return answer, best
+
+    def store(self, question, vector, answer, pipeline_seconds=None):
+        if answer is None:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.vectors is None:
+            self.vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+        if not self.free:
+            slot, _ = self.lru.popitem(last=False)
+            self.remove(slot)
+            self.evictions += 1
+        slot = self.free.pop()
+        self.vectors[slot] = vector / (np.linalg.norm(vector) or 1.0)
+        self.valid[slot] = True
+        self.entries[slot] = {"question": question, "answer": answer,
+                              "numbers": numbers(question), "created_at": time.time()}
+        self.lru[slot] = None
+        self.stores += 1
+        if pipeline_seconds is not None:
+            self.miss_latencies.append(pipeline_seconds)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        lookup = list(self.lookup_latencies)
+        pipeline = list(self.miss_latencies)
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "lookup_p50_ms": percentile(lookup, 0.5) * 1e3 if lookup else None,
+            "lookup_p99_ms": percentile(lookup, 0.99) * 1e3 if lookup else None,
+            "mean_hit_similarity": float(np.mean(self.hit_similarities)) if self.hit_similarities else None,
+            "miss_pipeline_p50_s": percentile(pipeline, 0.5) if pipeline else None,
+        }
+
+_answer_cache = None
+
+def get_answer_cache():
+    global _answer_cache
+    if _answer_cache is None and ANSWER_CACHE_ENABLED:
+        _answer_cache = SemanticAnswerCache()
+    return _answer_cache
@@ -0,0 +1,250 @@
+import os
+import asyncio
+import logging
+import threading
+import numpy as np
+from contextlib import asynccontextmanager
+import httpx
+from langchain_openai import AzureChatOpenAI
+from neo4j import AsyncGraphDatabase
+from qdrant_client import AsyncQdrantClient
+from RAG.llm_cache import CachedChatModel
+from RAG.local_graph import LocalGraph
+from RAG.entity_index import EntityIndex
+from RAG.local_vector import LocalVectorStore
+from RAG.lexical_index import LexicalIndex
+from RAG.embeddings import EMBEDDING_PROVIDER, BatchingEmbeddings, create_embeddings
+
+QDRANT_URL = "https://20840cd3-a3bf-4a62-af36-72b49fe3bed0.us-east-1-0.aws.cloud.qdrant.io"
+QDRANT_COLLECTION = "law"
+# "neo4j" queries the remote database; "local" serves the KG from an
+# in-process LocalGraph loaded from LOCAL_GRAPH_PATH (snapshot dir or CSV).
+KG_BACKEND = os.getenv("KG_BACKEND", "neo4j")
+LOCAL_GRAPH_PATH = os.getenv("LOCAL_GRAPH_PATH", "kg_snapshot")
+# "qdrant" searches the Qdrant Cloud collection; "local" a LocalVectorStore
+# written by qdrant_rag.py --backend local to LOCAL_VECTOR_PATH.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+LOCAL_VECTOR_PATH = os.getenv("LOCAL_VECTOR_PATH", "vector_store")
+# Fuzzy keyword -> :Entity name resolution, built at startup from every
+# entity name; entity-name embeddings (written by kg_to_neo4j.py --mode
+# snapshot --entity-embeddings) add a semantic ANN match when present.
+ENTITY_INDEX = os.getenv("ENTITY_INDEX", "true").lower() in ("1", "true", "yes")
+ENTITY_EMBEDDINGS_PATH = os.getenv("ENTITY_EMBEDDINGS_PATH", os.path.join(LOCAL_GRAPH_PATH, "entity_embeddings.npz"))
+ENTITY_NAMES_QUERY = "MATCH (e:Entity) RETURN e.name AS name"
+EDGE_COUNT_QUERY = "MATCH ()-[r:RELATION]->() RETURN count(r) AS edges"
+# BM25 index over the same chunks (qdrant_rag.py --lexical), fused with the
+# dense results; vector search stays dense-only when it is missing.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "lexical_index")
+
+logger = logging.getLogger(__name__)
+
+def files_mtime(path):
+    # Newest modification time of a file or of the files in a directory.
+    if not os.path.exists(path):
+        return None
+    if os.path.isfile(path):
+        return os.path.getmtime(path)
+    return max((entry.stat().st_mtime for entry in os.scandir(path) if entry.is_file()), default=None)
+
+def load_lexical_index():
+    if not os.path.exists(os.path.join(LEXICAL_INDEX_PATH, "config.json")):
+        logger.info(f"No lexical index at {LEXICAL_INDEX_PATH}, vector search is dense-only.")
+        return None
+    return LexicalIndex(LEXICAL_INDEX_PATH)
+
+class PoolUsage:
+    # In-flight counter for one shared client; the drivers do not expose
+    # their own pool occupancy, so saturation is measured at the call site.
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.in_use = 0
+        self.peak = 0
+        self.acquired = 0
+
+    @asynccontextmanager
+    async def track(self):
+        self.in_use += 1
+        self.acquired += 1
+        self.peak = max(self.peak, self.in_use)
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+
+    def snapshot(self):
+        return {
+            "in_use": self.in_use,
+            "max_size": self.max_size,
+            "saturation": self.in_use / self.max_size if self.max_size else 0.0,
+            "peak": self.peak,
+            "acquired": self.acquired,
+        }
+
+class ClientRegistry:
+    # Process-wide LLM, embedding, Neo4j and Qdrant clients with pooled
+    # connections, created once at startup and shared by every request.
+    def __init__(self, llm_pool_size=50, neo4j_pool_size=50, qdrant_pool_size=20):
+        self.usage = {
+            "llm": PoolUsage(llm_pool_size),
+            "neo4j": PoolUsage(neo4j_pool_size),
+            "qdrant": PoolUsage(qdrant_pool_size),
+        }
+        self.started = False
+        self.http_client = None
+        self.llm = None
+        self.embeddings = None
+        self.neo4j = None
+        self.graph = None
+        self.entities = None
+        self.qdrant = None
+        self.vectors = None
+        self.lexical = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            llm_pool_size=int(os.getenv("LLM_POOL_SIZE", 50)),
+            neo4j_pool_size=int(os.getenv("NEO4J_POOL_SIZE", 50)),
+            qdrant_pool_size=int(os.getenv("QDRANT_POOL_SIZE", 20)),
+        )
+
+    async def start(self):
+        if self.started:
+            return
+        llm_pool_size = self.usage["llm"].max_size
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=llm_pool_size, max_keepalive_connections=llm_pool_size),
+            timeout=30,
+        )
+        self.llm = CachedChatModel(AzureChatOpenAI(
+            azure_deployment="gpt-4o-mini",
+            api_version="2024-12-01-preview",
+            temperature=0,
+            max_tokens=4096,
+            timeout=30,
+            max_retries=2,
+            # Token usage on the last streamed chunk, for the final_llm metrics.
+            stream_usage=True,
+            http_async_client=self.http_client,
+        ))
+        # Concurrent requests share embedding calls (one batch per couple of ms).
+        self.embeddings = BatchingEmbeddings(create_embeddings(self.http_client))
+        if KG_BACKEND == "local":
+            self.graph = LocalGraph.open(LOCAL_GRAPH_PATH)
+        else:
+            self.neo4j = AsyncGraphDatabase.driver(
+                os.getenv("NEO4J_URI"),
+                auth=(os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD")),
+                max_connection_pool_size=self.usage["neo4j"].max_size,
+            )
+        if VECTOR_BACKEND == "local":
+            self.vectors = LocalVectorStore(LOCAL_VECTOR_PATH, embedding=self.embeddings)
+        else:
+            self.qdrant = AsyncQdrantClient(
+                url=QDRANT_URL,
+                api_key=os.getenv("QDRANT_API_KEY"),
+                prefer_grpc=True,
+                pool_size=self.usage["qdrant"].max_size,
+            )
+        if HYBRID_SEARCH:
+            self.lexical = load_lexical_index()
+        if ENTITY_INDEX:
+            self.entities = await self.build_entity_index()
+        self.started = True
+
+    async def build_entity_index(self):
+        try:
+            if self.graph is not None:
+                names = [self.graph.entities[i] for i in range(len(self.graph.entities))]
+            else:
+                async with self.neo4j.session(database=os.getenv("NEO4J_DATABASE", "neo4j")) as session:
+                    result = await session.run(ENTITY_NAMES_QUERY)
+                    names = [record["name"] async for record in result]
+        except Exception as e:
+            logger.warning(f"Entity index disabled, could not load entity names: {e}")
+            return None
+        index = EntityIndex(names)
+        if os.path.exists(ENTITY_EMBEDDINGS_PATH):
+            embeddings = np.load(ENTITY_EMBEDDINGS_PATH)
+            index.attach_embeddings(embeddings["names"], embeddings["vectors"])
+        logger.info(f"Entity index built over {len(names)} names (embeddings: {index.vectors is not None}).")
+        return index
+
+    async def close(self):
+        if not self.started:
+            return
+        self.started = False
+        if self.qdrant is not None:
+            await self.qdrant.close()
+        if self.neo4j is not None:
+            await self.neo4j.close()
+        await self.http_client.aclose()
+
+    async def index_fingerprint(self):
+        # Changes when the KG or a retrieval index is rebuilt: file times of
+        # the local snapshots, edge / point counts of the remote stores.
+        # None when a store cannot be reached.
+        try:
+            if self.graph is not None:
+                graph = ("local", files_mtime(LOCAL_GRAPH_PATH))
+            else:
+                async with self.track("neo4j"):
+                    async with self.neo4j.session(database=os.getenv("NEO4J_DATABASE", "neo4j")) as session:
+                        result = await session.run(EDGE_COUNT_QUERY)
+                        graph = ("neo4j", (await result.single())["edges"])
+            if self.vectors is not None:
+                vectors = ("local", files_mtime(LOCAL_VECTOR_PATH))
+            else:
+                async with self.track("qdrant"):
+                    vectors = ("qdrant", (await self.qdrant.get_collection(QDRANT_COLLECTION)).points_count)
+        except Exception as e:
+            logger.warning(f"Could not fingerprint the indexes: {e}")
+            return None
+        lexical = files_mtime(LEXICAL_INDEX_PATH) if self.lexical is not None else None
+        return graph, vectors, lexical
+
+    def track(self, name):
+        return self.usage[name].track()
+
+    def health(self):
+        pools = {name: usage.snapshot() for name, usage in self.usage.items()}
+        saturated = [name for name, pool in pools.items() if pool["saturation"] >= 1.0]
+        return {
+            "status": "ok" if self.started and not saturated else ("saturated" if saturated else "stopped"),
+            "pools": pools,
+            "kg_backend": KG_BACKEND,
+            "vector_backend": VECTOR_BACKEND,
+            "embedding_provider": EMBEDDING_PROVIDER,
+            "embeddings": self.embeddings.stats() if self.embeddings is not None else None,
+            "graph": self.graph.stats() if self.graph is not None else None,
+            "entity_index": len(self.entities.names) if self.entities is not None else None,
+            "lexical_index": len(self.lexical) if self.lexical is not None else None,
+        }
+
+registry = ClientRegistry.from_env()
+_start_lock = None
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+async def get_registry():
+    # Started by the FastAPI lifespan; scripts calling the async helpers
+    # directly get it started lazily on first use.
+    global _start_lock
+    if not registry.started:
+        if _start_lock is None:
+            _start_lock = asyncio.Lock()
+        async with _start_lock:
+            await registry.start()
+    return registry
+
+def run_sync(coroutine):
+    # The registry's httpx, Neo4j and Qdrant clients stay bound to the loop
+    # that started them, so sync callers share one background loop instead
+    # of a fresh asyncio.run() loop per call.
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="registry-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _sync_loop).result()
@@ -0,0 +1,161 @@
+import os
+import json
+from RAG.lexical_index import tokenize
+from RAG.tokens import count_tokens, token_prefix
+
+# Prompt-token budget for the retrieved context in final_node. KG facts get
+# up to KG_CONTEXT_SHARE of it first, chunks the rest, and any budget the
+# chunks leave unused goes back to the remaining KG facts.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000))
+KG_CONTEXT_SHARE = float(os.getenv("KG_CONTEXT_SHARE", 0.35))
+# Only `process_pdf.py --chunker recursive` overlaps neighbouring chunks, by
+# 150 characters (chunk_overlap in split_document). The default statute
+# chunker does not overlap, so for its index the overlap trim finds
+# nothing and only the repeated/contained-chunk dedupe applies.
+CHUNK_OVERLAP = 150
+MIN_OVERLAP = 20
+MIN_TRUNCATED_TOKENS = 100
+REF_LENGTH = 8
+KG_HEADING = "Knowledge graph facts (subject – predicate – object):"
+CHUNK_HEADING = "Law text excerpts:"
+ELLIPSIS = " …"
+
+def truncate_tokens(text, max_tokens):
+    # At most max_tokens including the ellipsis, cut on a character boundary.
+    if count_tokens(text) <= max_tokens:
+        return text
+    return token_prefix(text, max_tokens - count_tokens(ELLIPSIS)) + ELLIPSIS
+
+def reference_code(chunk_id):
+    # Chunk ids are 32-hex content/uuid hashes shared by chunks and the
+    # source_chunk of their triples, so a prefix is stable across requests.
+    return str(chunk_id)[:REF_LENGTH] if chunk_id else None
+
+def cite(refs):
+    refs = [r for r in dict.fromkeys(refs) if r]
+    return f" [ref: {', '.join(refs)}]" if refs else ""
+
+def kg_groups(records):
+    # Records as returned by akg_graph: {"subject", "predicate", "object",
+    # "source_chunk"}. Objects sharing subject and predicate collapse into
+    # one line; lines are grouped by subject. Any other record shape is kept
+    # as one JSON line.
+    groups = {}
+    other = []
+    for record in records or []:
+        if not isinstance(record, dict) or not {"subject", "predicate", "object"} <= record.keys():
+            other.append(json.dumps(record, ensure_ascii=False, default=str))
+            continue
+        facts = groups.setdefault(str(record["subject"]), {})
+        objects = facts.setdefault(str(record["predicate"]), {})
+        objects.setdefault(str(record["object"]), []).append(reference_code(record.get("source_chunk")))
+    return groups, other
+
+def render_group(subject, facts):
+    lines = []
+    for predicate, objects in facts.items():
+        refs = [ref for object_refs in objects.values() for ref in object_refs]
+        lines.append(f"{subject} – {predicate} – {'; '.join(objects)}{cite(refs)}")
+    return "\n".join(lines)
+
+def chunk_body(doc):
+    # page_content is "<header> <text>"; the header is rendered once per chunk.
+    header = str(doc.metadata.get("header") or "")
+    text = doc.page_content
+    if header and text.startswith(header):
+        text = text[len(header):].lstrip()
+    return header, text
+
+def overlap(previous, text):
+    # Length of the longest suffix of previous that starts text.
+    for size in range(min(CHUNK_OVERLAP, len(previous), len(text)), MIN_OVERLAP - 1, -1):
+        if previous.endswith(text[:size]):
+            return size
+    return 0
+
+def dedupe_chunks(docs):
+    # Drops repeated and contained chunks and strips the splitter overlap
+    # where a neighbouring chunk is already in the context.
+    kept = []
+    for doc in docs:
+        header, text = chunk_body(doc)
+        if any(text in other for _, _, other, _ in kept):
+            continue
+        for _, _, other, _ in kept:
+            text = text[overlap(other, text):]
+            cut = overlap(text, other)
+            if cut:
+                text = text[:-cut]
+        if text.strip():
+            kept.append((doc, header, text.strip(), reference_code(doc.metadata.get("chunk_id"))))
+    return kept
+
+def relevance(question_terms, text):
+    terms = set(tokenize(text))
+    return len(question_terms & terms) / (len(terms) ** 0.5 or 1)
+
+def assemble_context(question, kg_records, chunks, budget=CONTEXT_TOKEN_BUDGET):
+    # Returns (context text, stats) with the context within `budget` tokens.
+    stats = {"budget": budget}
+    question_terms = set(tokenize(question, query=True))
+    # What final_node used to send: str() of the raw records and chunk texts.
+    raw_tokens = count_tokens(str([kg_records, [doc.page_content for doc in chunks or []]]))
+    retrieved = len(chunks or [])
+    chunks = dedupe_chunks(chunks or [])
+    chunk_refs = {ref for *_, ref in chunks}
+
+    groups, other = kg_groups(kg_records)
+    kg_blocks = [render_group(subject, facts) for subject, facts in groups.items()] + other
+    # Subjects that match the question, or whose facts come from retrieved
+    # chunks, first; ties keep the graph order.
+    kg_blocks.sort(key=lambda block: -(relevance(question_terms, block) + 0.5 * any(ref in block for ref in chunk_refs if ref)))
+    kg_costs = [count_tokens(block) + 1 for block in kg_blocks]
+    budget -= count_tokens(KG_HEADING) + count_tokens(CHUNK_HEADING) + 4
+
+    kg_used, kg_taken = 0, 0
+    kg_budget = int(budget * KG_CONTEXT_SHARE)
+    while kg_taken < len(kg_blocks) and kg_used + kg_costs[kg_taken] <= kg_budget:
+        kg_used += kg_costs[kg_taken]
+        kg_taken += 1
+
+    # Chunks keep their retrieval (fusion) order; the last one that does not
+    # fit whole is cut to the remaining budget if enough is left for it.
+    chunk_texts = []
+    chunk_used = 0
+    for doc, header, text, ref in chunks:
+        block = f"[ref: {ref}] {header}\n{text}" if ref else f"{header}\n{text}"
+        cost = count_tokens(block) + 1
+        remaining = budget - kg_used - chunk_used
+        if cost > remaining:
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                block = truncate_tokens(block, remaining - 1)
+                chunk_texts.append(block)
+                chunk_used += count_tokens(block) + 1
+            break
+        chunk_texts.append(block)
+        chunk_used += cost
+
+    while kg_taken < len(kg_blocks) and kg_used + chunk_used + kg_costs[kg_taken] <= budget:
+        kg_used += kg_costs[kg_taken]
+        kg_taken += 1
+
+    sections = []
+    if kg_taken:
+        sections.append(KG_HEADING + "\n" + "\n".join(kg_blocks[:kg_taken]))
+    if chunk_texts:
+        sections.append(CHUNK_HEADING + "\n" + "\n\n".join(chunk_texts))
+    context = "\n\n".join(sections)
+
+    context_tokens = count_tokens(context)
+    stats.update({
+        "raw_tokens": raw_tokens,
+        "context_tokens": context_tokens,
+        "saved_tokens": max(0, raw_tokens - context_tokens),
+        "kg_records": len(kg_records or []),
+        "kg_lines": sum(block.count("\n") + 1 for block in kg_blocks[:kg_taken]),
+        "kg_subjects_dropped": len(kg_blocks) - kg_taken,
+        "chunks": len(chunk_texts),
+        "chunks_duplicate": retrieved - len(chunks),
+        "chunks_dropped": len(chunks) - len(chunk_texts),
+    })
+    return context, stats
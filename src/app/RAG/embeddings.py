@@ -0,0 +1,321 @@
+import os
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import AzureOpenAIEmbeddings
+
+try:
+    from fastembed import TextEmbedding
+except ImportError:
+    TextEmbedding = None
+
+EMBED_MODEL_DEPLOYMENT = "ace-text-embedding-3-large"
+# "azure" calls the deployment above; "local" runs LOCAL_EMBED_MODEL on CPU
+# through fastembed/ONNX. Vectors of the two are not interchangeable, so an
+# index has to be queried with the provider that built it.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "azure")
+LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "kg_embedding_cache.sqlite")
+)
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+EMBEDDING_CACHE_DISABLED = os.getenv("EMBEDDING_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+def encode_vector(vector, dtype):
+    # Returns (scale, bytes); int8 uses one symmetric scale per vector.
+    vector = np.asarray(vector, dtype=np.float32)
+    if dtype == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return scale, np.round(vector / scale).astype(np.int8).tobytes()
+    return 1.0, vector.astype(dtype).tobytes()
+
+def decode_vector(blob, dtype, scale):
+    vector = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+    return (vector * scale).tolist() if dtype == "int8" else vector.tolist()
+
+class EmbeddingCache:
+    # SQLite store of embeddings keyed by a hash of model + text, so
+    # re-indexing unchanged chunks costs no model calls. Vector bytes are
+    # capped at max_bytes with LRU eviction; the total is counted once at
+    # open and then kept up to date on every write.
+    def __init__(self, path=EMBEDDING_CACHE_PATH, dtype=EMBEDDING_CACHE_DTYPE, max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError("dtype must be float32, float16 or int8")
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.dtype = dtype
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dtype TEXT NOT NULL,
+                scale REAL NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(embeddings)")]
+        if "last_access" not in columns:
+            # Caches written before eviction existed start in insertion order.
+            self.conn.execute("ALTER TABLE embeddings ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+            self.conn.execute("UPDATE embeddings SET last_access = created_at")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_access)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys):
+        found = {}
+        now = time.time()
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, dtype, scale, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                )
+                for key, dtype, scale, blob in rows:
+                    found[key] = decode_vector(blob, dtype, scale)
+            if found:
+                self.conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+                self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def set_many(self, items):
+        # Returns the vectors as a later get_many will decode them, so a
+        # miss and a hit for the same text give the same vector.
+        now = time.time()
+        rows = {key: (key, self.dtype, *encode_vector(vector, self.dtype), now, now) for key, vector in items}
+        with self.lock:
+            keys = list(rows)
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                replaced = self.conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchone()[0]
+                self.total_bytes -= replaced
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dtype, scale, vector, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows.values()
+            )
+            self.total_bytes += sum(len(row[3]) for row in rows.values())
+            self._evict()
+            self.conn.commit()
+        return {key: decode_vector(row[3], self.dtype, row[2]) for key, row in rows.items()}
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self.conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access"):
+            if self.total_bytes <= self.max_bytes:
+                break
+            victims.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            size = self.total_bytes
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "dtype": self.dtype,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class LocalEmbeddings(Embeddings):
+    # fastembed ONNX model on CPU. Queries and documents go through
+    # query_embed/embed, which apply the model's own prefixes if it has any.
+    def __init__(self, model_name=LOCAL_EMBED_MODEL, batch_size=64, threads=None):
+        if TextEmbedding is None:
+            raise ImportError("fastembed is required for EMBEDDING_PROVIDER=local")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = TextEmbedding(model_name, threads=threads)
+
+    def embed_documents(self, texts):
+        return [v.tolist() for v in self.model.embed(texts, batch_size=self.batch_size)]
+
+    def embed_queries(self, texts):
+        return [v.tolist() for v in self.model.query_embed(texts)]
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_queries(self, texts):
+        return await asyncio.to_thread(self.embed_queries, texts)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_queries([text]))[0]
+
+# Models without a separate query encoding (Azure) embed a list of queries
+# exactly like documents, in one request.
+async def aembed_queries(embeddings, texts):
+    if hasattr(embeddings, "aembed_queries"):
+        return await embeddings.aembed_queries(texts)
+    return await embeddings.aembed_documents(texts)
+
+def embed_queries(embeddings, texts):
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return embeddings.embed_documents(texts)
+
+class CachedEmbeddings(Embeddings):
+    # Serves repeated texts from an EmbeddingCache and sends only the misses
+    # to the wrapped model, in one call.
+    def __init__(self, embeddings, cache, namespace):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.namespace = namespace
+
+    def key(self, kind, text):
+        return hashlib.sha256(f"{self.namespace}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+    def lookup(self, kind, texts):
+        keys = [self.key(kind, text) for text in texts]
+        found = self.cache.get_many(keys)
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in found))
+        return keys, found, missing
+
+    def store(self, kind, keys, found, missing, vectors):
+        found.update(self.cache.set_many([(self.key(kind, text), vector) for text, vector in zip(missing, vectors)]))
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts):
+        keys, found, missing = self.lookup("doc", texts)
+        vectors = self.embeddings.embed_documents(missing) if missing else []
+        return self.store("doc", keys, found, missing, vectors)
+
+    def embed_queries(self, texts):
+        keys, found, missing = self.lookup("query", texts)
+        vectors = embed_queries(self.embeddings, missing) if missing else []
+        return self.store("query", keys, found, missing, vectors)
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+    # The async paths run the sqlite lookup and write in a worker thread,
+    # off the event loop that also serves the batching drain task.
+    async def aembed_documents(self, texts):
+        keys, found, missing = await asyncio.to_thread(self.lookup, "doc", texts)
+        vectors = await self.embeddings.aembed_documents(missing) if missing else []
+        return await asyncio.to_thread(self.store, "doc", keys, found, missing, vectors)
+
+    async def aembed_queries(self, texts):
+        keys, found, missing = await asyncio.to_thread(self.lookup, "query", texts)
+        vectors = await aembed_queries(self.embeddings, missing) if missing else []
+        return await asyncio.to_thread(self.store, "query", keys, found, missing, vectors)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_queries([text]))[0]
+
+    def stats(self):
+        return self.cache.stats()
+
+class BatchingEmbeddings(Embeddings):
+    # Coalesces concurrent async embedding calls into one model call: the
+    # first caller waits max_wait seconds for others to join, then up to
+    # max_batch texts are embedded together. Sync calls pass straight through.
+    def __init__(self, embeddings, max_batch=64, max_wait=0.002):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = []
+        self.worker = None
+        self.batches = 0
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts):
+        return await self.submit("doc", texts)
+
+    async def aembed_query(self, text):
+        return (await self.submit("query", [text]))[0]
+
+    async def submit(self, kind, texts):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((kind, texts, future))
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.drain())
+        return await future
+
+    async def drain(self):
+        while self.pending:
+            await asyncio.sleep(self.max_wait)
+            for kind in ("query", "doc"):
+                batch, size = [], 0
+                for item in list(self.pending):
+                    if item[0] == kind and (not batch or size + len(item[1]) <= self.max_batch):
+                        batch.append(item)
+                        size += len(item[1])
+                for item in batch:
+                    self.pending.remove(item)
+                if batch:
+                    await self.run_batch(kind, batch)
+
+    async def run_batch(self, kind, batch):
+        texts = [text for _, item_texts, _ in batch for text in item_texts]
+        self.batches += 1
+        self.texts += len(texts)
+        try:
+            if kind == "query":
+                vectors = await aembed_queries(self.embeddings, texts)
+            else:
+                vectors = await self.embeddings.aembed_documents(texts)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        start = 0
+        for _, item_texts, future in batch:
+            if not future.done():
+                future.set_result(vectors[start:start + len(item_texts)])
+            start += len(item_texts)
+
+    def stats(self):
+        stats = {"batches": self.batches, "texts": self.texts,
+                 "mean_batch_size": self.texts / self.batches if self.batches else 0.0}
+        if hasattr(self.embeddings, "stats"):
+            stats["cache"] = self.embeddings.stats()
+        return stats
+
+def create_embeddings(http_async_client=None):
+    if EMBEDDING_PROVIDER == "local":
+        embeddings = LocalEmbeddings(LOCAL_EMBED_MODEL)
+        namespace = f"fastembed:{LOCAL_EMBED_MODEL}"
+    else:
+        embeddings = AzureOpenAIEmbeddings(model=EMBED_MODEL_DEPLOYMENT, http_async_client=http_async_client)
+        namespace = f"azure:{EMBED_MODEL_DEPLOYMENT}"
+    if EMBEDDING_CACHE_DISABLED:
+        return embeddings
+    return CachedEmbeddings(embeddings, EmbeddingCache(), namespace)
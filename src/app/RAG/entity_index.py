@@ -0,0 +1,104 @@
+import re
+import unicodedata
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+NON_WORD_RE = re.compile(r"[^\w]+")
+
+def fold(text):
+    # Diacritic- and case-insensitive key: "Stavební  povolení" -> "stavebni povoleni".
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return NON_WORD_RE.sub(" ", stripped).strip()
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class EntityIndex:
+    # Resolves free-text keywords to real :Entity names. Exact folded keys
+    # win; otherwise candidates are ranked by Dice similarity of character
+    # trigrams from an inverted index, merged with cosine similarity over
+    # entity-name embeddings when those are attached.
+    def __init__(self, names, min_score=0.3, min_similarity=0.5):
+        self.names = list(names)
+        self.min_score = min_score
+        self.min_similarity = min_similarity
+        self.exact = {}
+        self.trigram_ids = {}
+        postings = []
+        sizes = np.zeros(len(self.names), dtype=np.int32)
+        for i, name in enumerate(self.names):
+            key = fold(name)
+            self.exact.setdefault(key, []).append(i)
+            grams = trigrams(key)
+            sizes[i] = len(grams)
+            for gram in grams:
+                gram_id = self.trigram_ids.setdefault(gram, len(postings))
+                if gram_id == len(postings):
+                    postings.append([])
+                postings[gram_id].append(i)
+        self.postings = [np.array(p, dtype=np.int32) for p in postings]
+        self.sizes = sizes
+        self.vectors = None
+        self.ann = None
+
+    def attach_embeddings(self, names, vectors):
+        # Vectors for (a subset of) the names, in any order; rows for names
+        # the graph does not contain are ignored.
+        positions = {name: i for i, name in enumerate(self.names)}
+        dim = vectors.shape[1]
+        self.vectors = np.zeros((len(self.names), dim), dtype=np.float32)
+        for name, vector in zip(names, vectors):
+            i = positions.get(name)
+            if i is not None:
+                self.vectors[i] = vector
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.vectors /= np.where(norms == 0, 1, norms)
+        self.ann = None
+        if faiss is not None:
+            self.ann = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            self.ann.add(self.vectors)
+
+    def lexical(self, key, k):
+        grams = [self.trigram_ids[g] for g in trigrams(key) if g in self.trigram_ids]
+        if not grams:
+            return {}
+        shared = np.bincount(np.concatenate([self.postings[g] for g in grams]), minlength=len(self.names))
+        scores = 2.0 * shared / (len(trigrams(key)) + self.sizes)
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+        return {int(i): float(scores[i]) for i in top if scores[i] >= self.min_score}
+
+    def semantic(self, query_vector, k):
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = (query / (np.linalg.norm(query) or 1)).reshape(1, -1)
+        if self.ann is not None:
+            scores, ids = self.ann.search(query, k)
+            pairs = zip(ids[0], scores[0])
+        else:
+            scores = self.vectors @ query[0]
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+            pairs = zip(top, scores[top])
+        return {int(i): float(s) for i, s in pairs if i >= 0 and s >= self.min_similarity}
+
+    def resolve(self, keyword, k=5, query_vector=None):
+        key = fold(keyword)
+        scores = {i: 2.0 for i in self.exact.get(key, [])}
+        for i, score in self.lexical(key, k).items():
+            scores[i] = max(scores.get(i, 0.0), score)
+        if query_vector is not None and self.vectors is not None:
+            for i, score in self.semantic(query_vector, k).items():
+                scores[i] = max(scores.get(i, 0.0), score)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [self.names[i] for i, _ in ranked]
+
+    def resolve_many(self, keywords, k=5, query_vectors=None):
+        names = []
+        for j, keyword in enumerate(keywords):
+            vector = query_vectors[j] if query_vectors is not None else None
+            names.extend(self.resolve(keyword, k, vector))
+        return list(dict.fromkeys(names))
@@ -0,0 +1,99 @@
+import json
+
+class JsonFieldStreamer:
+    # Incremental parser that yields decoded text of selected string fields
+    # of the first JSON object in a stream, as the characters arrive.
+    # Text before the object (e.g. a ```json fence) is skipped, and a
+    # surrounding list is fine since fields are matched on the first object.
+    def __init__(self, fields):
+        self.fields = set(fields)
+        self.stack = []
+        self.target_depth = None
+        self.expecting_key = False
+        self.in_string = False
+        self.string_is_key = False
+        self.string_buffer = []
+        self.escape = None
+        self.pending_high_surrogate = None
+        self.last_key = None
+        self.streaming_key = None
+
+    def feed(self, text):
+        events = []
+        delta = []
+        for ch in text:
+            if self.in_string:
+                decoded = self._string_char(ch)
+                if decoded is None:
+                    if not self.in_string and self.streaming_key is not None:
+                        if delta:
+                            events.append(("delta", self.streaming_key, "".join(delta)))
+                            delta = []
+                        events.append(("end", self.streaming_key))
+                        self.streaming_key = None
+                    continue
+                if self.streaming_key is not None:
+                    delta.append(decoded)
+                elif self.string_is_key:
+                    self.string_buffer.append(decoded)
+                continue
+
+            if ch == '"':
+                self._start_string()
+                if self.streaming_key is not None:
+                    events.append(("start", self.streaming_key))
+            elif ch in "{[":
+                self.stack.append(ch)
+                if ch == "{" and self.target_depth is None:
+                    self.target_depth = len(self.stack)
+                self.expecting_key = ch == "{"
+            elif ch in "}]":
+                if self.stack:
+                    self.stack.pop()
+                self.expecting_key = False
+            elif ch == ",":
+                self.expecting_key = bool(self.stack) and self.stack[-1] == "{"
+            elif ch == ":":
+                self.expecting_key = False
+
+        if delta and self.streaming_key is not None:
+            events.append(("delta", self.streaming_key, "".join(delta)))
+        return events
+
+    def _at_target_object(self):
+        return self.target_depth is not None and len(self.stack) == self.target_depth
+
+    def _start_string(self):
+        self.in_string = True
+        self.string_is_key = self.expecting_key and self._at_target_object()
+        self.string_buffer = []
+        if not self.string_is_key and self._at_target_object() and self.last_key in self.fields:
+            self.streaming_key = self.last_key
+            self.last_key = None
+
+    def _string_char(self, ch):
+        # Returns decoded text for this character, "" while an escape is
+        # incomplete, or None when the string closes.
+        if self.escape is not None:
+            self.escape += ch
+            if self.escape[1] == "u" and len(self.escape) < 6:
+                return ""
+            decoded = json.loads(f'"{self.escape}"')
+            self.escape = None
+            if len(decoded) == 1 and 0xD800 <= ord(decoded) <= 0xDBFF:
+                self.pending_high_surrogate = decoded
+                return ""
+            if self.pending_high_surrogate is not None:
+                decoded = (self.pending_high_surrogate + decoded).encode("utf-16", "surrogatepass").decode("utf-16")
+                self.pending_high_surrogate = None
+            return decoded
+        if ch == "\\":
+            self.escape = ch
+            return ""
+        if ch == '"':
+            self.in_string = False
+            if self.string_is_key:
+                self.last_key = "".join(self.string_buffer)
+                self.expecting_key = False
+            return None
+        return ch
@@ -1,68 +1,170 @@
 import os 
-from langchain_openai import AzureChatOpenAI
-from langchain_community.graphs import Neo4jGraph
-from dotenv import load_dotenv
-from RAG.prompt import text2cypher, rewrite_to_czech
-from qdrant_client import QdrantClient
-from langchain_qdrant import QdrantVectorStore
+import json
+from json_repair import repair_json
+from RAG.prompt import kg_intent, rewrite_to_czech
+from RAG.clients import get_registry, run_sync, QDRANT_COLLECTION
+from RAG.lexical_index import reciprocal_rank_fusion
+from RAG.metrics import metrics
+from langchain_core.documents import Document
 
-from langchain_openai import AzureOpenAIEmbeddings
+RESOLVE_TOP_K = int(os.getenv("ENTITY_RESOLVE_TOP_K", 3))
+KG_RESULT_LIMIT = int(os.getenv("KG_RESULT_LIMIT", 100))
+MAX_HOPS = 2
+DIRECTIONS = ("out", "in", "both")
+VECTOR_TOP_K = 5
+# Candidates taken from each of the dense and BM25 rankings before fusion.
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+
+def cypher_template(direction, hops):
+    # Relationships within `hops` of the named entities, projected to plain
+    # strings. Only the variable-length bound is baked into the text, so the
+    # whole library is len(DIRECTIONS) * MAX_HOPS plan-cacheable queries.
+    reach = f"[:RELATION*0..{hops - 1}]"
+    pattern = {
+        "out": f"(s:Entity)-{reach}->(:Entity)-[r:RELATION]->(:Entity)",
+        "in": f"(s:Entity)<-{reach}-(:Entity)<-[r:RELATION]-(:Entity)",
+        "both": f"(s:Entity)-{reach}-(:Entity)-[r:RELATION]-(:Entity)",
+    }[direction]
+    return f"""
+MATCH {pattern}
+WHERE s.name IN $names
+WITH DISTINCT r
+WHERE startNode(r) <> endNode(r)
+RETURN startNode(r).name AS subject, r.type AS predicate, endNode(r).name AS object, r.source_chunk AS source_chunk
+LIMIT $limit
+"""
+
+CYPHER_TEMPLATES = {
+    (direction, hops): cypher_template(direction, hops)
+    for direction in DIRECTIONS for hops in range(1, MAX_HOPS + 1)
+}
+
+def parse_kg_intent(llm_output):
+    # Clamps whatever the model returned to a valid template key.
+    try:
+        intent = json.loads(repair_json(llm_output))
+    except ValueError:
+        intent = {}
+    if not isinstance(intent, dict):
+        intent = {}
+    keywords = intent.get("keywords")
+    if not isinstance(keywords, list):
+        keywords = []
+    keywords = [k.strip().lower() for k in keywords if isinstance(k, str) and k.strip()]
+    direction = intent.get("direction") if intent.get("direction") in DIRECTIONS else "both"
+    try:
+        hops = min(MAX_HOPS, max(1, int(intent.get("hops", 1))))
+    except (TypeError, ValueError):
+        hops = 1
+    return {"keywords": list(dict.fromkeys(keywords)), "direction": direction, "hops": hops}
 
-def clean_embedding(text):
-    for record in text:
-        for k, v in record.items():
-            if isinstance(v, (tuple, list)):
-                for d in v:
-                    if isinstance(d, dict) and "embedding" in d:
-                        d.pop("embedding")
-            elif isinstance(v, dict) and "embedding" in v:
-                v.pop("embedding")
-    return text
 def kg_graph(query):
-    llm = AzureChatOpenAI(
-                azure_deployment="gpt-4o-mini",  
-                api_version="2024-12-01-preview",
-                temperature=0,
-                max_tokens=4096,
-                timeout=30,
-                max_retries=2,
-            )
-    graph = Neo4jGraph()
-    text2cypher_formated = text2cypher.replace("<user_question_replace>",query)
-    res = llm.invoke(text2cypher_formated).content
-    response = graph.query(str(res))
-    cleaned_response = clean_embedding(response)
-    return cleaned_response
+    # Sync entry points for scripts; they go through the shared registry
+    # like the API, so no clients are built per call.
+    return run_sync(akg_graph(query))
 
 def vector_rag(query):
-    llm = AzureChatOpenAI(
-                azure_deployment="gpt-4o-mini",  
-                api_version="2024-12-01-preview",
-                temperature=0,
-                max_tokens=4096,
-                timeout=30,
-                max_retries=2,
-            )
-    rewrite_query = llm.invoke(rewrite_to_czech.replace("<input_replace>", query)).content
-    embeddings = AzureOpenAIEmbeddings(model="ace-text-embedding-3-large")
+    return run_sync(avector_rag(query))
 
-    QDRANT_URL = "https://20840cd3-a3bf-4a62-af36-72b49fe3bed0.us-east-1-0.aws.cloud.qdrant.io"
-    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")  # Ensure your API key is set in env
-    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+def hybrid_fuse(dense, lexical, query):
+    # Reciprocal rank fusion of the dense Documents with BM25 hits for the
+    # same query; chunks are matched by page_content, which both indexes share.
+    if lexical is None:
+        return dense[:VECTOR_TOP_K]
+    sparse = lexical.similarity_search(query, k=HYBRID_CANDIDATES)
+    by_text = {}
+    for doc in dense + sparse:
+        by_text.setdefault(doc.page_content, doc)
+    order = reciprocal_rank_fusion([[doc.page_content for doc in dense], [doc.page_content for doc in sparse]])
+    return [by_text[text] for text in order[:VECTOR_TOP_K]]
 
-    vectorstore = QdrantVectorStore(
-                                    client=client,
-                                    collection_name="law",
-                                    embedding=embeddings
-                                )
+async def resolve_entities(clients, keywords):
+    index = clients.entities
+    query_vectors = None
+    if index.vectors is not None and keywords:
+        async with clients.track("llm"), metrics.stage("embedding") as stage:
+            query_vectors = await clients.embeddings.aembed_documents(keywords)
+            stage.results(len(keywords))
+    with metrics.stage("entity_resolution") as stage:
+        names = index.resolve_many(keywords, k=RESOLVE_TOP_K, query_vectors=query_vectors)
+        stage.results(len(names))
+    return names
 
+async def akg_graph(query):
+    clients = await get_registry()
+    async with clients.track("llm"), metrics.stage("text2cypher") as stage:
+        response = await clients.llm.ainvoke(kg_intent.replace("<user_question_replace>", query))
+        stage.usage(response)
+    intent = parse_kg_intent(response.content)
+    names = intent["keywords"]
+    if clients.entities is not None:
+        # Keywords rarely match a node name exactly; query the closest real names instead.
+        names = await resolve_entities(clients, names)
+    if not names:
+        return []
+    if clients.graph is not None:
+        with metrics.stage("cypher") as stage:
+            response = clients.graph.k_hop(names, hops=intent["hops"], direction=intent["direction"], limit=KG_RESULT_LIMIT)
+            stage.results(len(response))
+        return response
+    response = []
+    async with clients.track("neo4j"), metrics.stage("cypher") as stage:
+        async with clients.neo4j.session(database=os.getenv("NEO4J_DATABASE", "neo4j"),
+                                         fetch_size=KG_RESULT_LIMIT) as session:
+            result = await session.run(
+                CYPHER_TEMPLATES[intent["direction"], intent["hops"]], names=names, limit=KG_RESULT_LIMIT
+            )
+            async for record in result:
+                response.append(record.data())
+        stage.results(len(response))
+    return response
+
+async def avector_search(query):
+    # Best chunks as Documents, metadata (chunk_id, header) included.
+    clients = await get_registry()
+    if clients.lexical is not None:
+        # "§ 4 trestní zákoník" needs neither the rewrite nor an embedding.
+        with metrics.stage("section_lookup") as stage:
+            found = clients.lexical.section_lookup(query, k=VECTOR_TOP_K)
+            stage.results(len(found or []))
+        if found:
+            return found
+    async with clients.track("llm"):
+        async with metrics.stage("rewrite") as stage:
+            response = await clients.llm.ainvoke(rewrite_to_czech.replace("<input_replace>", query))
+            stage.usage(response)
+        rewrite_query = response.content
+        async with metrics.stage("embedding") as stage:
+            query_vector = await clients.embeddings.aembed_query(rewrite_query)
+            stage.results(1)
+
+    limit = HYBRID_CANDIDATES if clients.lexical is not None else VECTOR_TOP_K
+    if clients.vectors is not None:
+        with metrics.stage("vector_search") as stage:
+            docs = clients.vectors.similarity_search_by_vector(query_vector, k=limit)
+            stage.results(len(docs))
+    else:
+        async with clients.track("qdrant"), metrics.stage("vector_search") as stage:
+            # Same payload layout QdrantVectorStore writes: page_content + metadata.
+            found = await clients.qdrant.query_points(
+                collection_name=QDRANT_COLLECTION,
+                query=query_vector,
+                limit=limit,
+                with_payload=True,
+            )
+            stage.results(len(found.points))
+        docs = [Document(page_content=point.payload["page_content"], metadata=point.payload.get("metadata") or {})
+                for point in found.points]
+    if clients.lexical is None:
+        return docs
+    with metrics.stage("lexical_search"):
+        return hybrid_fuse(docs, clients.lexical, rewrite_query)
 
-    found_docs = vectorstore.similarity_search(rewrite_query, k=5)
-    docs = [doc.page_content for doc in found_docs]
-    return docs
+async def avector_rag(query):
+    return [doc.page_content for doc in await avector_search(query)]
 
 if '__main__' == __name__:
     query = "How is the taxpayer's tax calculated?"
-    # print(kg_graph(llm, query, text2cypher))
+    # print(kg_graph(query))
     search_result = vector_rag(query)
     print(search_result[0])
@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import math
+import functools
+import numpy as np
+from collections import Counter
+from langchain_core.documents import Document
+from RAG.entity_index import fold
+from RAG.local_graph import StringTable, save_arrays, load_array, csr
+from RAG.local_vector import top_k
+
+# "§ 4" anywhere is a reference to section 4; on a line of its own it is the
+# heading that starts the section. References index as "§4", headings also
+# as "§§4", and queries ask for both, so the defining chunk ranks first.
+SECTION_RE = re.compile(r"§+\s*(\d+[a-z]?)\b", re.IGNORECASE)
+SECTION_HEADING_RE = re.compile(r"^\s*§\s*(\d+[a-z]?)\s*$", re.IGNORECASE | re.MULTILINE)
+HYPHENATION_RE = re.compile("\xad\\s*")
+
+STOPWORDS = set("""
+a aby ac ale anebo ani ano asi az bez bude budou by byl byla byli bylo byt ci co coz cz
+da do ho i jak jako je jeho jej jeji jejich jen jenz jeste ji jine jiz jsem jsi jsme jsou
+jste k kam kde kdo kdyz ke ktera ktere kteri kterou ktery ku li ma mate me mezi mi mit
+mu muze my na nad nam nas ne nebo nebot necht nejsou neni nez ni nic nim o od on ona oni
+ono ony pak po pod podle pokud pouze pro proc proto pri s se si sice snad sve svych svym
+svymi ta tak take takze tato te tedy teto ten tento teto tim timto tito to tohle toho
+tohoto tom tomto tomuto tu tuto ty tyto u uz v vam vas ve vice vsak z za ze zda zde
+""".split())
+
+# Light Czech stemmer over folded text: strips one case/number ending while
+# leaving a stem of at least three characters, so "povinnosti",
+# "povinnostmi" and "povinnost" share a term.
+CASE_ENDINGS = sorted("""
+atech atum ata aty ama ami ach ech ich ych eti ete emi imi ymi ovi ove ovy ova ovou
+ho mu ou em ym im om am es mi ch
+a e i o u y
+""".split(), key=len, reverse=True)
+
+def stem(token):
+    if token.isdigit():
+        return token
+    for ending in CASE_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= 3:
+            return token[:-len(ending)]
+    return token
+
+def tokenize(text, query=False):
+    text = HYPHENATION_RE.sub("", text)
+    tokens = [f"§{n.lower()}" for n in SECTION_RE.findall(text)]
+    if query:
+        tokens += [f"§{t}" for t in tokens]
+    else:
+        tokens += [f"§§{n.lower()}" for n in SECTION_HEADING_RE.findall(text)]
+    for word in fold(SECTION_RE.sub(" ", text)).split():
+        if word not in STOPWORDS and (len(word) > 1 or word.isdigit()):
+            tokens.append(stem(word))
+    return tokens
+
+@functools.lru_cache(maxsize=4096)
+def law_terms(header, name):
+    return frozenset(tokenize(f"{header} {name}"))
+
+def reciprocal_rank_fusion(rankings, k=60):
+    # Each ranking is a best-first list of keys; returns keys by fused score.
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class LexicalIndex:
+    # BM25 over the chunk texts as an on-disk inverted index: terms in a
+    # StringTable, postings (doc ids + term frequencies) in CSR order, all
+    # memory-mapped, so a query touches only the posting lists of its terms.
+    def __init__(self, path):
+        with open(os.path.join(path, "config.json"), encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.path = path
+        self.terms = StringTable.load(path, "terms")
+        self.term_offsets = load_array(path, "term_offsets")
+        self.postings_docs = load_array(path, "postings_docs")
+        self.postings_tfs = load_array(path, "postings_tfs")
+        self.doc_lengths = load_array(path, "doc_lengths", mmap=False).astype(np.float32)
+        self.texts = StringTable.load(path, "texts")
+        self.metadatas = StringTable.load(path, "metadatas")
+        self.k1 = self.config["k1"]
+        self.b = self.config["b"]
+        self.norms = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.config["avgdl"], 1e-9))
+
+    @classmethod
+    def build(cls, path, texts, metadatas, k1=1.2, b=0.75):
+        os.makedirs(path, exist_ok=True)
+        term_ids = {}
+        keys, docs, tfs = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                keys.append(term_ids.setdefault(term, len(term_ids)))
+                docs.append(doc)
+                tfs.append(min(tf, 65535))
+        term_offsets, order = csr(np.array(keys, dtype=np.int64), len(term_ids))
+        save_arrays(path, {
+            "term_offsets": term_offsets,
+            "postings_docs": np.array(docs, dtype=np.int32)[order],
+            "postings_tfs": np.array(tfs, dtype=np.uint16)[order],
+            "doc_lengths": doc_lengths,
+        })
+        StringTable.from_strings(list(term_ids)).save(path, "terms")
+        StringTable.from_strings(texts).save(path, "texts")
+        StringTable.from_strings([json.dumps(m, ensure_ascii=False, default=str) for m in metadatas]).save(path, "metadatas")
+        config = {"count": len(texts), "terms": len(term_ids), "postings": len(docs),
+                  "avgdl": float(doc_lengths.mean()) if len(texts) else 0.0, "k1": k1, "b": b}
+        with open(os.path.join(path, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        return cls(path)
+
+    @classmethod
+    def from_documents(cls, documents, path, **kwargs):
+        return cls.build(path, [doc.page_content for doc in documents], [doc.metadata for doc in documents], **kwargs)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def postings(self, term):
+        term_id = self.terms.find(term)
+        if term_id is None:
+            return None
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        return self.postings_docs[start:end], self.postings_tfs[start:end].astype(np.float32)
+
+    def scores(self, terms):
+        scores = np.zeros(len(self), dtype=np.float32)
+        count = len(self)
+        for term in set(terms):
+            found = self.postings(term)
+            if found is None:
+                continue
+            docs, tfs = found
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self.norms[docs])
+        return scores
+
+    def search(self, query, k=5):
+        # Returns (ids, BM25 scores), best first, only chunks sharing a term.
+        scores = self.scores(tokenize(query, query=True))
+        ids = top_k(scores, k) if len(scores) else np.empty(0, dtype=np.int64)
+        ids = ids[scores[ids] > 0]
+        return ids, scores[ids]
+
+    def section_lookup(self, query, k=5, max_terms=3):
+        # Answers "§ 4 trestní zákoník"-style queries from the index alone:
+        # the query must be section references plus a few terms naming the
+        # law, and every hit must contain all of the references and carry
+        # all of the name terms in its header. Anything else ("§ 4 Criminal
+        # Code", "what does § 4 say") returns None and goes to hybrid search.
+        tokens = tokenize(query, query=True)
+        sections = [t for t in tokens if t.startswith("§") and not t.startswith("§§")]
+        names = set(t for t in tokens if not t.startswith("§"))
+        if not sections or not names or len(names) > max_terms:
+            return None
+        candidates = None
+        for term in set(sections):
+            found = self.postings(term)
+            if found is None:
+                return None
+            candidates = found[0] if candidates is None else np.intersect1d(candidates, found[0])
+        candidates = np.array([i for i in candidates if names <= self.law_terms(int(i))], dtype=np.int64)
+        if not len(candidates):
+            return None
+        scores = self.scores(tokens)[candidates]
+        return [self.document(int(candidates[i])) for i in top_k(scores, k)]
+
+    def law_terms(self, i):
+        metadata = json.loads(self.metadatas[i])
+        return law_terms(str(metadata.get("header") or ""), str(metadata.get("name") or ""))
+
+    def document(self, i):
+        return Document(page_content=self.texts[i], metadata=json.loads(self.metadatas[i]))
+
+    def similarity_search(self, query, k=5):
+        ids, _ = self.search(query, k)
+        return [self.document(int(i)) for i in ids]
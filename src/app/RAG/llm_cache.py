@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "kg_llm_cache.sqlite"))
+DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL", 0)) or None
+
+def prompt_to_messages(prompt):
+    if isinstance(prompt, str):
+        return [["human", prompt]]
+    return [[m.type, m.content] if isinstance(m, BaseMessage) else list(m) for m in prompt]
+
+def cache_key(llm, prompt, overrides=None):
+    prompt_hash = hashlib.sha256(
+        json.dumps(prompt_to_messages(prompt), ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    key = {
+        "model": getattr(llm, "model_name", None),
+        "deployment": getattr(llm, "deployment_name", None),
+        "temperature": getattr(llm, "temperature", None),
+        "max_tokens": getattr(llm, "max_tokens", None),
+        "prompt": prompt_hash,
+    }
+    if overrides:
+        # Per-call parameters such as max_tokens change the response.
+        key.update(overrides)
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# A cached response is stored as a JSON record so finish_reason and the
+# model name survive a hit; older entries hold the bare content string.
+RECORD_KEYS = {"content", "response_metadata"}
+NO_USAGE = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+def encode_response(content, response_metadata):
+    return json.dumps({"content": content, "response_metadata": response_metadata}, ensure_ascii=False, default=str)
+
+def decode_response(value, message_class=AIMessage):
+    # Hits are marked with cache_hit and report zero usage, so token and
+    # cost counters only see calls that reached the model.
+    content, response_metadata = value, {}
+    try:
+        record = json.loads(value)
+    except ValueError:
+        record = None
+    if isinstance(record, dict) and set(record) == RECORD_KEYS:
+        content, response_metadata = record["content"], record["response_metadata"]
+    return message_class(content=content, response_metadata={**response_metadata, "cache_hit": True},
+                         usage_metadata=dict(NO_USAGE))
+
+class NullLLMCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+class SQLiteLLMCache:
+    # Disk-backed response cache with size-based LRU eviction and optional TTL.
+    # The byte total is summed once at open and then kept up to date on
+    # every insert and delete, so a write never scans the table.
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, created_at, size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and row[1] + self.ttl < now:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= row[2]
+                self.conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            replaced = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self.total_bytes += size - (replaced[0] if replaced else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if self.total_bytes <= self.max_bytes:
+                break
+            victims.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            size = self.total_bytes
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+                _default_cache = NullLLMCache()
+            else:
+                _default_cache = SQLiteLLMCache()
+        return _default_cache
+
+class CachedChatModel:
+    # Drop-in wrapper around a chat model's invoke/ainvoke that serves
+    # repeated prompts from the cache. Other attributes pass through.
+    def __init__(self, llm, cache=None):
+        self.llm = llm
+        self.cache = cache if cache is not None else get_llm_cache()
+
+    def invoke(self, prompt, **kwargs):
+        key = cache_key(self.llm, prompt, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return decode_response(cached)
+        response = self.llm.invoke(prompt, **kwargs)
+        self.cache.set(key, encode_response(response.content, response.response_metadata))
+        return response
+
+    # The async paths run the sqlite lookup and write in a worker thread so
+    # a slow disk or a held cache lock does not stall the event loop.
+    async def ainvoke(self, prompt, **kwargs):
+        key = cache_key(self.llm, prompt, kwargs)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return decode_response(cached)
+        response = await self.llm.ainvoke(prompt, **kwargs)
+        await asyncio.to_thread(self.cache.set, key, encode_response(response.content, response.response_metadata))
+        return response
+
+    async def astream(self, prompt, **kwargs):
+        key = cache_key(self.llm, prompt, kwargs)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            yield decode_response(cached, AIMessageChunk)
+            return
+        parts = []
+        response_metadata = {}
+        async for chunk in self.llm.astream(prompt, **kwargs):
+            parts.append(chunk.content)
+            response_metadata.update(chunk.response_metadata)
+            yield chunk
+        await asyncio.to_thread(self.cache.set, key, encode_response("".join(parts), response_metadata))
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_VERSION = 1
+TRIPLE_COLUMNS = ["subject", "predicate", "object"]
+# Every cell as text, so a column (or streamed chunk) of number-like
+# entity names is not parsed to int/float and then dropped as invalid.
+READ_OPTIONS = {"dtype": str, "keep_default_na": False}
+WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_triple_columns(triples_df):
+    # Vectorized equivalent of the per-row normalization: non-string cells
+    # become NaN through the .str accessor and are counted as invalid.
+    def normalized(column):
+        if column not in triples_df:
+            return pd.Series(np.nan, index=triples_df.index, dtype=object)
+        values = triples_df[column]
+        if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+            return pd.Series(np.nan, index=triples_df.index, dtype=object)
+        # Object dtype keeps Python"s str.strip/lower and re semantics for Unicode whitespace.
+        return values.astype(object).str.strip().str.lower()
+
+    subject = normalized("subject")
+    predicate = normalized("predicate").str.replace(WHITESPACE_RE, " ", regex=True)
+    obj = normalized("object")
+
+    if "chunk_id" in triples_df:
+        source_chunk = triples_df["chunk_id"]
+    elif "source_chunk" in triples_df:
+        source_chunk = triples_df["source_chunk"]
+    else:
+        source_chunk = pd.Series("unknown", index=triples_df.index, dtype=object)
+
+    valid = (
+        subject.notna() & predicate.notna() & obj.notna()
+        & subject.ne("") & predicate.ne("") & obj.ne("")
+    )
+    normalized_df = pd.DataFrame({
+        "subject": subject[valid],
+        "predicate": predicate[valid],
+        "object": obj[valid],
+        "source_chunk": source_chunk[valid].astype(object),
+    })
+    return normalized_df, int((~valid).sum())
+
+class StringTable:
+    # Interned strings as one UTF-8 blob plus offsets, with a permutation
+    # sorted by bytes for binary-search lookup. All three arrays can be
+    # memory-mapped, so opening a snapshot does not decode every name.
+    def __init__(self, blob, offsets, order):
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int32)
+        return cls(blob, offsets, order)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        return self.raw(i).decode("utf-8")
+
+    def find(self, s):
+        key = s.encode("utf-8")
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(self.order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self.raw(self.order[lo]) == key:
+            return int(self.order[lo])
+        return None
+
+    def arrays(self, prefix):
+        return {f"{prefix}_blob": self.blob, f"{prefix}_offsets": self.offsets, f"{prefix}_order": self.order}
+
+    def save(self, out_dir, prefix):
+        save_arrays(out_dir, self.arrays(prefix))
+
+    @classmethod
+    def load(cls, snapshot_dir, prefix, mmap=True):
+        return cls(*(load_array(snapshot_dir, f"{prefix}_{part}", mmap) for part in ("blob", "offsets", "order")))
+
+def save_arrays(out_dir, arrays):
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), np.ascontiguousarray(array))
+
+def load_array(snapshot_dir, name, mmap=True):
+    # np.asarray drops the np.memmap subclass (slow to slice) but keeps the mapping.
+    return np.asarray(np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode="r" if mmap else None))
+
+def csr(keys, n):
+    # Edge ids grouped by key: edges of node i are edges[offsets[i]:offsets[i + 1]].
+    edges = np.argsort(keys, kind="stable").astype(np.int32)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=offsets[1:])
+    return offsets, edges
+
+class LocalGraph:
+    # In-process, read-only copy of the :Entity/:RELATION graph that
+    # kg_to_neo4j.py loads: entities, predicates and source chunks are
+    # interned, edges are parallel int32 arrays indexed by CSR offsets for
+    # both directions.
+    ARRAYS = ["src", "dst", "pred", "chunk", "out_offsets", "out_edges", "in_offsets", "in_edges"]
+
+    def __init__(self, entities, predicates, chunks, arrays):
+        self.entities = entities
+        self.predicates = predicates
+        self.chunks = chunks
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_triples(cls, df):
+        # Expects normalized, de-duplicated triples with a source_chunk column.
+        entity_codes, entity_names = pd.factorize(pd.concat([df["subject"], df["object"]], ignore_index=True))
+        pred_codes, pred_names = pd.factorize(df["predicate"])
+        chunk_codes, chunk_names = pd.factorize(df["source_chunk"].astype(str))
+        n = len(entity_names)
+        src = entity_codes[:len(df)].astype(np.int32)
+        dst = entity_codes[len(df):].astype(np.int32)
+        out_offsets, out_edges = csr(src, n)
+        in_offsets, in_edges = csr(dst, n)
+        arrays = {
+            "src": src, "dst": dst,
+            "pred": pred_codes.astype(np.int32), "chunk": chunk_codes.astype(np.int32),
+            "out_offsets": out_offsets, "out_edges": out_edges,
+            "in_offsets": in_offsets, "in_edges": in_edges,
+        }
+        return cls(
+            StringTable.from_strings(list(entity_names)),
+            StringTable.from_strings(list(pred_names)),
+            StringTable.from_strings(list(chunk_names)),
+            arrays,
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        # Same read options and normalization as kg_to_neo4j.py, so the local
+        # graph holds exactly the names that get loaded into Neo4j.
+        df, _ = normalize_triple_columns(pd.read_csv(csv_path, **READ_OPTIONS))
+        return cls.from_triples(df.drop_duplicates(subset=TRIPLE_COLUMNS))
+
+    def save(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        save_arrays(out_dir, {name: getattr(self, name) for name in self.ARRAYS})
+        self.entities.save(out_dir, "entities")
+        self.predicates.save(out_dir, "predicates")
+        self.chunks.save(out_dir, "chunks")
+        with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, **self.stats()}, f)
+
+    @classmethod
+    def load(cls, snapshot_dir, mmap=True):
+        with open(os.path.join(snapshot_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported graph snapshot version {meta.get('version')} in {snapshot_dir}")
+        return cls(
+            StringTable.load(snapshot_dir, "entities", mmap),
+            StringTable.load(snapshot_dir, "predicates", mmap),
+            StringTable.load(snapshot_dir, "chunks", mmap),
+            {name: load_array(snapshot_dir, name, mmap) for name in cls.ARRAYS},
+        )
+
+    @classmethod
+    def open(cls, path):
+        # A snapshot directory or a triples CSV.
+        if os.path.isdir(path):
+            return cls.load(path)
+        return cls.from_csv(path)
+
+    def stats(self):
+        return {"entities": len(self.entities), "predicates": len(self.predicates), "edges": len(self.src)}
+
+    def node_id(self, name):
+        return self.entities.find(name)
+
+    def edge_ids(self, node, direction="both"):
+        parts = []
+        if direction in ("out", "both"):
+            parts.append(self.out_edges[self.out_offsets[node]:self.out_offsets[node + 1]])
+        if direction in ("in", "both"):
+            parts.append(self.in_edges[self.in_offsets[node]:self.in_offsets[node + 1]])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def record(self, edge):
+        # Same columns as the Cypher templates in kg_rag.py project.
+        return {
+            "subject": self.entities[self.src[edge]],
+            "predicate": self.predicates[self.pred[edge]],
+            "object": self.entities[self.dst[edge]],
+            "source_chunk": self.chunks[self.chunk[edge]],
+        }
+
+    def neighbours(self, name, direction="both", limit=None):
+        node = self.node_id(name)
+        if node is None:
+            return []
+        edges = self.edge_ids(node, direction)
+        edges = edges[self.src[edges] != self.dst[edges]]
+        return [self.record(int(e)) for e in edges[:limit]]
+
+    def k_hop(self, names, hops=2, direction="both", limit=None):
+        # Breadth-first expansion from the named entities; returns the edges
+        # reached within `hops`, nearest first.
+        frontier = np.array([n for n in map(self.node_id, names) if n is not None], dtype=np.int32)
+        visited_nodes = set(frontier.tolist())
+        seen_edges = set()
+        ordered = []
+        for _ in range(hops):
+            if not len(frontier) or (limit is not None and len(ordered) >= limit):
+                break
+            edges = np.concatenate([self.edge_ids(node, direction) for node in frontier])
+            edges = edges[self.src[edges] != self.dst[edges]]
+            next_nodes = set()
+            for e in edges.tolist():
+                if limit is not None and len(ordered) >= limit:
+                    break
+                if e in seen_edges:
+                    continue
+                seen_edges.add(e)
+                ordered.append(e)
+                for node in (int(self.src[e]), int(self.dst[e])):
+                    if node not in visited_nodes:
+                        visited_nodes.add(node)
+                        next_nodes.add(node)
+            frontier = np.fromiter(next_nodes, dtype=np.int32, count=len(next_nodes))
+        return [self.record(e) for e in ordered]
@@ -0,0 +1,162 @@
+import os
+import json
+import numpy as np
+from langchain_core.documents import Document
+from RAG.local_graph import StringTable, save_arrays, load_array
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+SEARCH_BLOCK_ROWS = 65536
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def default_pq_m(dim):
+    # Sub-quantizer count for IVF-PQ; must divide the dimension.
+    return next((m for m in (96, 64, 48, 32, 24, 16, 8, 4, 2) if dim % m == 0 and m <= dim), 1)
+
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+class LocalVectorStore:
+    # On-disk replacement for the Qdrant collection: normalized float32
+    # vectors in a memory-mapped .npy, page_content and metadata as
+    # memory-mapped StringTables, and an optional faiss index. "flat" scans
+    # the mapped vectors exactly; "hnsw" keeps a graph index in RAM; "ivfpq"
+    # keeps only compressed codes in RAM and re-ranks the best candidates
+    # against the mapped vectors, for corpora larger than memory.
+    def __init__(self, path, embedding=None):
+        with open(os.path.join(path, "config.json"), encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.path = path
+        self.embedding = embedding
+        self.vectors = load_array(path, "vectors")
+        self.texts = StringTable.load(path, "texts")
+        self.metadatas = StringTable.load(path, "metadatas")
+        self.index = None
+        index_type = self.config["index_type"]
+        if index_type != "flat":
+            if faiss is None:
+                raise ImportError(f"faiss-cpu is required to open a '{index_type}' index")
+            self.index = faiss.read_index(os.path.join(path, "index.faiss"))
+        self.set_search_params(self.config.get("ef_search", 64), self.config.get("nprobe", 16), self.config.get("rerank", 10))
+
+    def set_search_params(self, ef_search=64, nprobe=16, rerank=10):
+        self.rerank = rerank
+        if self.config["index_type"] == "hnsw":
+            self.index.hnsw.efSearch = ef_search
+        elif self.config["index_type"] == "ivfpq":
+            self.index.nprobe = nprobe
+
+    @classmethod
+    def build(cls, path, vectors, texts, metadatas, index_type="hnsw", embedding=None,
+              hnsw_m=32, ef_construction=200, nlist=None, pq_m=None, pq_bits=None, **search_params):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {INDEX_TYPES}")
+        if index_type != "flat" and faiss is None:
+            raise ImportError(f"faiss-cpu is required to build a '{index_type}' index")
+        os.makedirs(path, exist_ok=True)
+        vectors = normalize(vectors)
+        count, dim = vectors.shape
+        save_arrays(path, {"vectors": vectors})
+        StringTable.from_strings(texts).save(path, "texts")
+        StringTable.from_strings([json.dumps(m, ensure_ascii=False, default=str) for m in metadatas]).save(path, "metadatas")
+
+        config = {"index_type": index_type, "dim": dim, "count": count, **search_params}
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = ef_construction
+            index.add(vectors)
+        elif index_type == "ivfpq":
+            nlist = nlist or max(1, min(int(4 * np.sqrt(count)), count // 39))
+            pq_m = pq_m or default_pq_m(dim)
+            # Each sub-quantizer trains 2**pq_bits centroids and wants ~39 points per centroid.
+            pq_bits = pq_bits or int(min(8, max(1, np.log2(max(2, count // 39)))))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_bits, faiss.METRIC_INNER_PRODUCT)
+            sample = np.random.default_rng(0).choice(count, min(count, max(64 * nlist, 10_000)), replace=False)
+            index.train(vectors[np.sort(sample)])
+            index.add(vectors)
+            config.update(nlist=nlist, pq_m=pq_m, pq_bits=pq_bits)
+        if index_type != "flat":
+            faiss.write_index(index, os.path.join(path, "index.faiss"))
+        with open(os.path.join(path, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        return cls(path, embedding)
+
+    @classmethod
+    def from_documents(cls, documents, embedding, path, batch_size=256, **kwargs):
+        texts = [doc.page_content for doc in documents]
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            vectors.extend(embedding.embed_documents(texts[start:start + batch_size]))
+        return cls.build(path, np.array(vectors, dtype=np.float32), texts,
+                         [doc.metadata for doc in documents], embedding=embedding, **kwargs)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def exact_search(self, query, k):
+        # Blocked scan so only one block of the mapped matrix is touched at a time.
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(self.vectors), SEARCH_BLOCK_ROWS):
+            scores = self.vectors[start:start + SEARCH_BLOCK_ROWS] @ query
+            top = top_k(scores, k)
+            best_ids = np.concatenate([best_ids, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+        order = top_k(best_scores, k)
+        return best_ids[order], best_scores[order]
+
+    def search(self, query_vector, k=4):
+        # Returns (ids, cosine scores), best first. An empty store, k <= 0
+        # or an IVF probe that reaches no vectors gives empty arrays.
+        if k <= 0 or len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize(query_vector).reshape(-1)
+        if self.index is None:
+            return self.exact_search(query, k)
+        fetch = k * self.rerank if self.config["index_type"] == "ivfpq" else k
+        scores, ids = self.index.search(query.reshape(1, -1), fetch)
+        # faiss pads missing results with id -1.
+        found = ids[0] >= 0
+        ids, scores = ids[0][found], scores[0][found]
+        if self.config["index_type"] == "ivfpq" and self.rerank > 1:
+            ids = np.sort(ids)
+            exact = self.vectors[ids] @ query
+            order = top_k(exact, k)
+            return ids[order], exact[order]
+        return ids[:k], scores[:k]
+
+    def document(self, i):
+        return Document(page_content=self.texts[i], metadata=json.loads(self.metadatas[i]))
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        ids, scores = self.search(embedding, k)
+        return [(self.document(int(i)), float(s)) for i, s in zip(ids, scores)]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query, k=4):
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    async def asimilarity_search(self, query, k=4):
+        return self.similarity_search_by_vector(await self.embedding.aembed_query(query), k)
+
+    def memory_bytes(self):
+        # Resident index size; the mapped vectors and strings are paged in on demand.
+        return int(faiss.serialize_index(self.index).nbytes) if self.index is not None else 0
@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+
+# USD per million tokens, gpt-4o-mini list prices by default.
+LLM_PROMPT_PRICE = float(os.getenv("LLM_PROMPT_PRICE", 0.15))
+LLM_COMPLETION_PRICE = float(os.getenv("LLM_COMPLETION_PRICE", 0.60))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+METRICS = {
+    "rag_stage_duration_seconds": ("histogram", "Wall time of one pipeline stage."),
+    "rag_stage_errors_total": ("counter", "Stage calls that raised."),
+    "rag_stage_results": ("histogram", "Records, chunks or names a stage returned."),
+    "rag_llm_tokens_total": ("counter", "LLM tokens per stage; cached responses count none."),
+    "rag_llm_cache_hits_total": ("counter", "LLM calls per stage served from the response cache."),
+    "rag_llm_cost_usd_total": ("counter", "Estimated LLM cost per stage from LLM_PROMPT_PRICE / LLM_COMPLETION_PRICE."),
+    "rag_router_decisions_total": ("counter", "Router decisions by source (local / llm) and route."),
+    "rag_context_tokens_total": ("counter", "Tokens of retrieved material before (raw) and after (context) assembly."),
+    "rag_pool_in_use": ("gauge", "In-flight calls per shared client."),
+}
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Stage:
+    # Times one stage as a (sync or async) context manager; an exception
+    # counts as an error and is re-raised. results() and usage() attach the
+    # result size and the LLM token usage of the call.
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.labels = {"stage": name}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        self.metrics.observe("rag_stage_duration_seconds", self.labels, time.perf_counter() - self.start)
+        if kind is not None and issubclass(kind, Exception):
+            self.metrics.inc("rag_stage_errors_total", self.labels)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, kind, error, traceback):
+        return self.__exit__(kind, error, traceback)
+
+    def results(self, size):
+        self.metrics.observe("rag_stage_results", self.labels, size, SIZE_BUCKETS)
+
+    def usage(self, message):
+        # usage_metadata is set on invoke responses and on the last chunk of
+        # a stream (stream_usage=True); cache hits report zero usage and are
+        # counted separately.
+        if (getattr(message, "response_metadata", None) or {}).get("cache_hit"):
+            self.metrics.inc("rag_llm_cache_hits_total", self.labels)
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return
+        prompt, completion = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        self.metrics.inc("rag_llm_tokens_total", {**self.labels, "type": "prompt"}, prompt)
+        self.metrics.inc("rag_llm_tokens_total", {**self.labels, "type": "completion"}, completion)
+        cost = (prompt * LLM_PROMPT_PRICE + completion * LLM_COMPLETION_PRICE) / 1e6
+        self.metrics.inc("rag_llm_cost_usd_total", self.labels, cost)
+
+class Metrics:
+    # In-process counters, gauges and histograms rendered in the Prometheus
+    # text format by render(); one instance per worker process.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, labels, value=1):
+        key = self.key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, labels, value):
+        with self.lock:
+            self.values[self.key(name, labels)] = value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+    def render(self):
+        lines = []
+        with self.lock:
+            items = sorted(self.values.items(), key=lambda item: item[0])
+            for name, (kind, help_text) in METRICS.items():
+                series = [(labels, value) for (metric, labels), value in items if metric == name]
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series:
+                    if kind != "histogram":
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ("+Inf",), value.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(value.sum)}")
+                    lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
@@ -0,0 +1,84 @@
+import os
+import math
+from collections import Counter
+import pandas as pd
+from RAG.lexical_index import tokenize, SECTION_RE
+
+ROUTES = ("rag", "none")
+# "local" decides confident questions locally and asks the LLM otherwise,
+# "llm" always asks the LLM (the old behaviour), "local-only" never does.
+ROUTER_MODE = os.getenv("ROUTER_MODE", "local")
+ROUTER_CONFIDENCE = float(os.getenv("ROUTER_CONFIDENCE", 0.9))
+# A wrong local "none" answers a legal question without retrieval, while a
+# wrong "rag" only costs a retrieval, so skipping needs more confidence.
+ROUTER_NONE_CONFIDENCE = float(os.getenv("ROUTER_NONE_CONFIDENCE", 0.99))
+ROUTER_EXAMPLES_PATH = os.getenv(
+    "ROUTER_EXAMPLES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_examples.csv")
+)
+
+def parse_route(text):
+    # The LLM is asked for a bare "rag" or "none"; anything else means rag,
+    # as before, so an odd reply never skips retrieval.
+    return "none" if text.strip().strip(".`'\"").lower() == "none" else "rag"
+
+def features(question):
+    # Folded, stemmed words (Czech and English alike) plus word pairs, each
+    # counted once per question.
+    words = tokenize(question)
+    return set(words) | {f"{a}_{b}" for a, b in zip(words, words[1:])}
+
+def is_confident(route, confidence, threshold=ROUTER_CONFIDENCE, none_threshold=ROUTER_NONE_CONFIDENCE):
+    return confidence >= (none_threshold if route == "none" else threshold)
+
+class LocalRouter:
+    # Binarized multinomial naive Bayes over `features`, trained from
+    # labelled questions in milliseconds at startup. predict() returns the
+    # route and its posterior probability; questions with no known feature
+    # fall back to the class prior and so stay below any useful threshold.
+    def __init__(self, examples, alpha=0.5):
+        counts = {route: Counter() for route in ROUTES}
+        questions = Counter()
+        for question, route in examples:
+            counts[route].update(features(question))
+            questions[route] += 1
+        vocabulary = set().union(*counts.values())
+        total = sum(questions.values())
+        self.log_prior = {route: math.log((questions[route] + 1) / (total + len(ROUTES))) for route in ROUTES}
+        self.log_likelihood = {}
+        for route in ROUTES:
+            denominator = sum(counts[route].values()) + alpha * len(vocabulary)
+            for feature in vocabulary:
+                self.log_likelihood.setdefault(feature, {})[route] = math.log((counts[route][feature] + alpha) / denominator)
+        self.examples = total
+
+    @classmethod
+    def from_csv(cls, path=ROUTER_EXAMPLES_PATH):
+        frame = pd.read_csv(path)
+        return cls(zip(frame["question"], frame["label"]))
+
+    def predict(self, question):
+        if SECTION_RE.search(question):
+            return "rag", 1.0
+        scores = dict(self.log_prior)
+        known = False
+        for feature in features(question):
+            likelihood = self.log_likelihood.get(feature)
+            if likelihood is None:
+                continue
+            known = True
+            for route in ROUTES:
+                scores[route] += likelihood[route]
+        if not known:
+            return "rag", 0.0
+        best = max(scores.values())
+        total = sum(math.exp(score - best) for score in scores.values())
+        route = max(scores, key=scores.get)
+        return route, 1.0 / total
+
+_local_router = None
+
+def get_local_router():
+    global _local_router
+    if _local_router is None:
+        _local_router = LocalRouter.from_csv()
+    return _local_router
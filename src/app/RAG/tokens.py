@@ -0,0 +1,42 @@
+import functools
+import tiktoken
+
+@functools.lru_cache(maxsize=None)
+def get_encoder():
+    # One shared o200k_base (gpt-4o / gpt-4o-mini) encoder for chunking,
+    # header detection, rate budgeting and context assembly.
+    return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text, enc=None):
+    return len((enc or get_encoder()).encode_ordinary(text))
+
+def token_prefix(text, max_tokens, enc=None, whitespace=True):
+    # Longest prefix of text within max_tokens that ends on a whole
+    # character. A token window can stop inside a multi-byte character (any
+    # Czech diacritic), which decode() would turn into U+FFFD. With
+    # whitespace, the cut moves back to the last space or newline if one
+    # lies in the second half of the prefix.
+    enc = enc or get_encoder()
+    tokens = enc.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    prefix = enc.decode_bytes(tokens[:max_tokens]).decode("utf-8", errors="ignore")
+    if whitespace:
+        cut = max(prefix.rfind(" "), prefix.rfind("\n"))
+        if cut > len(prefix) // 2:
+            prefix = prefix[:cut]
+    # Re-encoding a prefix can merge differently; never return more tokens.
+    while prefix and count_tokens(prefix, enc) > max_tokens:
+        prefix = prefix[:-1]
+    return prefix
+
+def split_tokens(text, max_tokens, enc=None):
+    # Consecutive pieces of at most max_tokens, each cut as in token_prefix.
+    # Leading whitespace is dropped before measuring: " §" and "§" encode
+    # differently, so stripping a measured piece could exceed the budget.
+    text = text.lstrip()
+    while text:
+        piece = token_prefix(text, max_tokens, enc) or text[0]
+        text = text[len(piece):].lstrip()
+        if piece.rstrip():
+            yield piece.rstrip()
@@ -1,10 +1,22 @@
+import json
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from models import QuestionRequest, QueryRequest, AgentResponse, VectorRAGResponse, KGGraphResponse
-from services import agent_service, vector_rag_service, kg_graph_service
+from services import agent_service, agent_stream_service, vector_rag_service, kg_graph_service, llm_cache_stats_service, health_service
+from services import answer_cache_stats_service, answer_cache_invalidate_service, metrics_service
+from RAG.clients import registry
 import logging
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await registry.start()
+    yield
+    await registry.close()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="RAG API",
     description="API for Hybrid Retrieval, Vector Search, and Knowledge Graph",
     version="1.0.0"
@@ -24,31 +36,71 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 @app.post("/agent", response_model=AgentResponse)
-def run_agent(request: QuestionRequest):
+async def run_agent(request: QuestionRequest):
     try:
-        answer = agent_service(request.question)
+        answer = await agent_service(request.question, thread_id=request.thread_id)
         return AgentResponse(answer=answer)
     except Exception as e:
         logger.error(f"Agent error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/agent/stream")
+async def run_agent_stream(request: QuestionRequest):
+    # Server-sent events: node progress, answer_delta/answer_reset while the
+    # final answer is generated, then done with the complete answer.
+    async def event_source():
+        try:
+            async for event in agent_stream_service(request.question, thread_id=request.thread_id):
+                yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Agent stream error: {e}")
+            yield f"event: error\ndata: {json.dumps({'event': 'error', 'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/vector-rag", response_model=VectorRAGResponse)
-def run_vector_rag(request: QueryRequest):
+async def run_vector_rag(request: QueryRequest):
     try:
-        docs = vector_rag_service(request.query)
+        docs = await vector_rag_service(request.query)
         return VectorRAGResponse(docs=docs)
     except Exception as e:
         logger.error(f"Vector RAG error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/kg-graph", response_model=KGGraphResponse)
-def run_kg_graph(request: QueryRequest):
+async def run_kg_graph(request: QueryRequest):
     try:
-        result = kg_graph_service(request.query)
+        result = await kg_graph_service(request.query)
         return KGGraphResponse(result=result)
     except Exception as e:
         logger.error(f"KG Graph error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/health")
+def health():
+    return health_service()
+
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    return llm_cache_stats_service()
+
+@app.get("/answer-cache/stats")
+def answer_cache_stats():
+    return answer_cache_stats_service()
+
+@app.post("/answer-cache/invalidate")
+def answer_cache_invalidate():
+    return answer_cache_invalidate_service()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Prometheus text format: per-stage latency histograms, errors, result
+    # sizes, LLM tokens and estimated cost.
+    return PlainTextResponse(metrics_service(), media_type="text/plain; version=0.0.4")
     
 if __name__ == "__main__":
     import uvicorn
@@ -1,8 +1,9 @@
 from pydantic import BaseModel
-from typing import List, Any
+from typing import List, Any, Optional
 
 class QuestionRequest(BaseModel):
     question: str
+    thread_id: Optional[str] = None
 
 class QueryRequest(BaseModel):
     query: str
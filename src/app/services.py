@@ -1,14 +1,45 @@
-from RAG.agent import create_agent
-from RAG.kg_rag import kg_graph as kg_graph_func, vector_rag as vector_rag_func
+from typing import Optional
+from RAG.agent import acreate_agent, astream_agent
+from RAG.kg_rag import akg_graph as kg_graph_func, avector_rag as vector_rag_func
+from RAG.llm_cache import get_llm_cache
+from RAG.answer_cache import get_answer_cache
+from RAG.metrics import metrics
+from RAG.clients import registry
 
-def agent_service(question: str):
-    result = create_agent(question)
+async def agent_service(question: str, thread_id: Optional[str] = None):
+    result = await acreate_agent(question, thread_id=thread_id)
     return result
 
-def vector_rag_service(query: str):
-    result = vector_rag_func(query)
+def agent_stream_service(question: str, thread_id: Optional[str] = None):
+    return astream_agent(question, thread_id=thread_id)
+
+async def vector_rag_service(query: str):
+    result = await vector_rag_func(query)
     return result
 
-def kg_graph_service(query: str):
-    result = kg_graph_func(query)
+async def kg_graph_service(query: str):
+    result = await kg_graph_func(query)
     return result
+
+def llm_cache_stats_service():
+    return get_llm_cache().stats()
+
+def answer_cache_stats_service():
+    cache = get_answer_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+def answer_cache_invalidate_service():
+    # For rebuilds the fingerprint cannot see, e.g. a re-upload to the same
+    # Qdrant collection with an unchanged point count.
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.invalidate()
+    return answer_cache_stats_service()
+
+def health_service():
+    return registry.health()
+
+def metrics_service():
+    for name, usage in registry.usage.items():
+        metrics.set("rag_pool_in_use", {"pool": name}, usage.in_use)
+    return metrics.render()